@@ -0,0 +1,307 @@
+"""Кэш для нескольких воркеров на одной машине без внешних сервисов.
+
+SQLiteCache - общий для всех процессов кэш в файле SQLite.
+TwoTierCache - ограниченный по размеру LRU в памяти процесса перед
+SQLiteCache. Каждая запись в общем кэше получает штамп; локальная
+копия сверяет свой штамп с общим не чаще раза в SYNC_INTERVAL секунд,
+так что запись или удаление в одном воркере доходят до остальных
+не позже чем через этот интервал.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+class SQLiteCache(BaseCache):
+    """Кэш в файле SQLite, общий для процессов одной машины."""
+
+    cull_every = 100
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = threading.local()
+        self._sets = 0
+
+    def _connection(self):
+        # После fork соединение родителя использовать нельзя.
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self._path, timeout=10, isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+            )
+            self._local.connection = connection
+            self._local.pid = pid
+        return self._local.connection
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def get(self, key, default=None, version=None):
+        row = self._connection().execute(
+            'SELECT value FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self._key(key, version), time.time())
+        ).fetchone()
+        return default if row is None else pickle.loads(row[0])
+
+    def get_many(self, keys, version=None):
+        made_keys = {self._key(key, version): key for key in keys}
+        if not made_keys:
+            return {}
+        rows = self._connection().execute(
+            'SELECT key, value FROM cache WHERE key IN ({}) '
+            'AND (expires IS NULL OR expires > ?)'.format(
+                ', '.join('?' * len(made_keys))
+            ),
+            (*made_keys, time.time())
+        ).fetchall()
+        return {made_keys[key]: pickle.loads(value) for key, value in rows}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        connection = self._connection()
+        connection.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires) '
+            'VALUES (?, ?, ?)',
+            (
+                self._key(key, version),
+                pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                self.get_backend_timeout(timeout),
+            )
+        )
+        self._sets += 1
+        if self._sets % self.cull_every == 0:
+            self._cull(connection)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                (key, time.time())
+            )
+            added = connection.execute(
+                'INSERT OR IGNORE INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)',
+                (
+                    key,
+                    pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                    self.get_backend_timeout(timeout),
+                )
+            ).rowcount
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return bool(added)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return bool(self._connection().execute(
+            'UPDATE cache SET expires = ? WHERE key = ?',
+            (self.get_backend_timeout(timeout), self._key(key, version))
+        ).rowcount)
+
+    def delete(self, key, version=None):
+        self._connection().execute(
+            'DELETE FROM cache WHERE key = ?', (self._key(key, version),)
+        )
+
+    def has_key(self, key, version=None):
+        return self._connection().execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self._key(key, version), time.time())
+        ).fetchone() is not None
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+    def _cull(self, connection):
+        connection.execute(
+            'DELETE FROM cache WHERE expires <= ?', (time.time(),)
+        )
+        count, = connection.execute('SELECT COUNT(*) FROM cache').fetchone()
+        if count > self._max_entries:
+            connection.execute(
+                'DELETE FROM cache WHERE key IN ('
+                # Бессрочные записи (штампы версий) вытесняются
+                # последними: NULL в ORDER BY идёт первым.
+                'SELECT key FROM cache '
+                'ORDER BY expires IS NULL, expires LIMIT ?)',
+                (count // self._cull_frequency,)
+            )
+
+
+class TwoTierCache(BaseCache):
+    """LRU в памяти процесса перед общим SQLiteCache.
+
+    OPTIONS: LOCAL_MAX_ENTRIES и LOCAL_MAX_BYTES ограничивают локальный
+    уровень, SYNC_INTERVAL - как долго локальной копии верят без сверки
+    штампа; MAX_ENTRIES и CULL_FREQUENCY относятся к общему уровню.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._local_max_entries = int(options.get('LOCAL_MAX_ENTRIES', 1000))
+        self._local_max_bytes = int(options.get('LOCAL_MAX_BYTES', 2 ** 24))
+        self._sync_interval = float(options.get('SYNC_INTERVAL', 1))
+        self.shared = SQLiteCache(location, params)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _stamp_key(key):
+        return 'stamp:{}'.format(key)
+
+    def _remember(self, made_key, stamp, expires, blob):
+        with self._lock:
+            self._forget(made_key)
+            if len(blob) > self._local_max_bytes:
+                return
+            self._entries[made_key] = [stamp, expires, blob, time.monotonic()]
+            self._bytes += len(blob)
+            while (
+                len(self._entries) > self._local_max_entries
+                or self._bytes > self._local_max_bytes
+            ):
+                _, (_, _, old_blob, _) = self._entries.popitem(last=False)
+                self._bytes -= len(old_blob)
+
+    def _forget(self, made_key):
+        entry = self._entries.pop(made_key, None)
+        if entry is not None:
+            self._bytes -= len(entry[2])
+
+    def get(self, key, default=None, version=None):
+        made_key = self.make_key(key, version=version)
+        self.validate_key(made_key)
+        with self._lock:
+            entry = self._entries.get(made_key)
+            if entry is not None and entry[1] is not None \
+                    and entry[1] <= time.time():
+                self._forget(made_key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(made_key)
+                if time.monotonic() - entry[3] < self._sync_interval:
+                    return pickle.loads(entry[2])
+        stamp = self.shared.get(self._stamp_key(key), version=version)
+        if entry is not None and stamp == entry[0]:
+            entry[3] = time.monotonic()
+            return pickle.loads(entry[2])
+        stored = None if stamp is None else self.shared.get(
+            key, version=version
+        )
+        if stored is None:
+            with self._lock:
+                self._forget(made_key)
+            return default
+        self._remember(made_key, *stored)
+        return pickle.loads(stored[2])
+
+    def get_many(self, keys, version=None):
+        """Как get, но со сверкой штампов и чтением одним запросом."""
+        found, entries = {}, {}
+        now, moment = time.time(), time.monotonic()
+        with self._lock:
+            for key in keys:
+                made_key = self.make_key(key, version=version)
+                self.validate_key(made_key)
+                entry = self._entries.get(made_key)
+                if entry is not None and entry[1] is not None \
+                        and entry[1] <= now:
+                    self._forget(made_key)
+                    entry = None
+                if entry is not None:
+                    self._entries.move_to_end(made_key)
+                    if moment - entry[3] < self._sync_interval:
+                        found[key] = pickle.loads(entry[2])
+                        continue
+                entries[key] = entry
+        if not entries:
+            return found
+        stamps = self.shared.get_many(
+            [self._stamp_key(key) for key in entries], version=version
+        )
+        changed = []
+        for key, entry in entries.items():
+            stamp = stamps.get(self._stamp_key(key))
+            if entry is not None and stamp == entry[0]:
+                entry[3] = time.monotonic()
+                found[key] = pickle.loads(entry[2])
+            elif stamp is not None:
+                changed.append(key)
+            elif entry is not None:
+                with self._lock:
+                    self._forget(self.make_key(key, version=version))
+        stored = self.shared.get_many(changed, version=version)
+        for key in changed:
+            made_key = self.make_key(key, version=version)
+            if key in stored:
+                self._remember(made_key, *stored[key])
+                found[key] = pickle.loads(stored[key][2])
+            else:
+                with self._lock:
+                    self._forget(made_key)
+        return found
+
+    def _pack(self, value, timeout):
+        expires = self.get_backend_timeout(timeout)
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        return (time.time_ns(), expires, blob)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        stored = self._pack(value, timeout)
+        self.shared.set(key, stored, timeout, version=version)
+        self.shared.set(
+            self._stamp_key(key), stored[0], timeout, version=version
+        )
+        self._remember(self.make_key(key, version=version), *stored)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        stored = self._pack(value, timeout)
+        if not self.shared.add(key, stored, timeout, version=version):
+            return False
+        self.shared.set(
+            self._stamp_key(key), stored[0], timeout, version=version
+        )
+        self._remember(self.make_key(key, version=version), *stored)
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._lock:
+            self._forget(self.make_key(key, version=version))
+        self.shared.touch(self._stamp_key(key), timeout, version=version)
+        return self.shared.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self.shared.delete(self._stamp_key(key), version=version)
+        self.shared.delete(key, version=version)
+        with self._lock:
+            self._forget(self.make_key(key, version=version))
+
+    def clear(self):
+        self.shared.clear()
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
@@ -0,0 +1,104 @@
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+from statistics import mean
+from time import perf_counter
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.cache import SQLiteCache, TwoTierCache
+from core.metrics import percentile
+
+
+BACKENDS = {
+    'locmem': LocMemCache,
+    'sqlite': SQLiteCache,
+    'two-tier': TwoTierCache,
+}
+
+
+def _run_worker(args):
+    """Один воркер: читает ключи, при промахе «рисует» и кладёт значение."""
+    backend, location, requests, keys, size, seed = args
+    cache = BACKENDS[backend](location, {
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': keys * 2, 'LOCAL_MAX_ENTRIES': keys},
+    })
+    rng = random.Random(seed)
+    value = 'x' * size
+    hits, latencies = 0, []
+    for _ in range(requests):
+        # Популярные ключи читаются чаще: квадрат сдвигает выбор к нулю.
+        key = 'page:{}'.format(int(keys * rng.random() ** 2))
+        start = perf_counter()
+        found = cache.get(key)
+        latencies.append(perf_counter() - start)
+        if found is None:
+            cache.set(key, value)
+        else:
+            hits += 1
+    return hits, latencies
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает долю попаданий и задержку чтения кэшей '
+        'при разном числе воркеров.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, nargs='+', default=[1, 2, 4, 8]
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=20000,
+            help='Всего чтений на прогон, делятся между воркерами.',
+        )
+        parser.add_argument('--keys', type=int, default=2000)
+        parser.add_argument('--size', type=int, default=20000)
+        parser.add_argument(
+            '--backends', nargs='+', choices=BACKENDS, default=list(BACKENDS)
+        )
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context('fork')
+        report = []
+        for backend in options['backends']:
+            for workers in options['workers']:
+                with tempfile.TemporaryDirectory() as directory:
+                    location = os.path.join(directory, 'cache.sqlite3')
+                    jobs = [
+                        (
+                            backend,
+                            location,
+                            options['requests'] // workers,
+                            options['keys'],
+                            options['size'],
+                            seed,
+                        ) for seed in range(workers)
+                    ]
+                    start = perf_counter()
+                    with context.Pool(workers) as pool:
+                        results = pool.map(_run_worker, jobs)
+                    elapsed = perf_counter() - start
+                latencies = [
+                    latency for _, worker in results for latency in worker
+                ]
+                report.append({
+                    'backend': backend,
+                    'workers': workers,
+                    'hit_ratio': round(
+                        sum(hits for hits, _ in results) / len(latencies), 4
+                    ),
+                    'get_mean_us': round(mean(latencies) * 10 ** 6, 2),
+                    'get_p95_us': round(
+                        percentile(latencies, 0.95) * 10 ** 6, 2
+                    ),
+                    'seconds': round(elapsed, 3),
+                })
+        self.stdout.write(json.dumps(report, indent=2))
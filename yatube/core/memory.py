@@ -0,0 +1,141 @@
+"""Учёт выделений памяти в запросах через tracemalloc.
+
+MemoryMiddleware для выбранных запросов (доля MEMORY_SAMPLE_RATE,
+вьюхи из MEMORY_VIEWS, заголовок X-Profile-Memory с PROFILER_TOKEN)
+меряет пик и прирост выделенной памяти, кладёт их в гистограммы
+memory_registry с меткой вьюхи и пишет в лог самые прожорливые
+места. tracemalloc считает память всего процесса, поэтому
+одновременно отслеживается только один запрос, а остальные
+в это время пропускаются.
+
+allocation_budget - то же измерение для тестов: падает, если код
+внутри with выделил в пике больше заданного.
+"""
+import logging
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from .metrics import Registry, registries
+from .profiling import sampled, view_name
+
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'HTTP_X_PROFILE_MEMORY'
+FRAMES = 1
+TOP = 10
+BYTES_BUCKETS = tuple(2 ** power for power in range(14, 31, 2))
+MEMORY_METRICS = (
+    ('yatube_view_memory_peak_bytes', 'Пик выделенной памяти, байт',
+     BYTES_BUCKETS),
+    ('yatube_view_memory_net_bytes', 'Память, не освобождённая к концу '
+     'запроса, байт', BYTES_BUCKETS),
+)
+_IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+memory_registry = Registry(MEMORY_METRICS, shared=True)
+registries.append(memory_registry)
+_lock = threading.Lock()
+
+
+class Allocations:
+    """Итог измерения: пик и прирост в байтах, места выделений."""
+
+    peak = 0
+    net = 0
+    top = ()
+
+    def report(self):
+        return '\n'.join(
+            '{}:{}: {:+d} B, {:+d} блоков'.format(
+                diff.traceback[0].filename, diff.traceback[0].lineno,
+                diff.size_diff, diff.count_diff,
+            )
+            for diff in self.top
+        )
+
+
+def _reset_peak():
+    """Сбрасывает пик, если это умеет tracemalloc (Python 3.9+)."""
+    reset_peak = getattr(tracemalloc, 'reset_peak', None)
+    if reset_peak is None:
+        return False
+    reset_peak()
+    return True
+
+
+@contextmanager
+def track_allocations(top=TOP):
+    """Меряет выделения памяти внутри with."""
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(FRAMES)
+    allocations = Allocations()
+    try:
+        before = tracemalloc.take_snapshot()
+        base, _ = tracemalloc.get_traced_memory()
+        # Без reset_peak пик отсчитывается от запуска трассировки: он
+        # верен, только если её запустили здесь. Иначе известна лишь
+        # нижняя граница - память к концу измерения.
+        fresh = _reset_peak() or started
+        yield allocations
+        current, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        if started:
+            tracemalloc.stop()
+    allocations.peak = (peak if fresh else max(current, base)) - base
+    allocations.net = current - base
+    allocations.top = [
+        diff for diff in after.filter_traces(_IGNORED).compare_to(
+            before.filter_traces(_IGNORED), 'lineno'
+        )[:top] if diff.size_diff > 0
+    ]
+
+
+@contextmanager
+def allocation_budget(limit, top=TOP):
+    """Проверка для тестов: пик выделений внутри with не больше limit."""
+    with track_allocations(top) as allocations:
+        yield allocations
+    if allocations.peak > limit:
+        raise AssertionError(
+            'Выделено {} B в пике при бюджете {} B:\n{}'.format(
+                allocations.peak, limit, allocations.report()
+            )
+        )
+
+
+class MemoryMiddleware:
+    """Меряет память выбранных запросов, см. описание модуля."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not sampled(
+            request, settings.MEMORY_SAMPLE_RATE, settings.MEMORY_VIEWS,
+            HEADER,
+        ) or not _lock.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            with track_allocations() as allocations:
+                response = self.get_response(request)
+        finally:
+            _lock.release()
+        view = view_name(request)
+        memory_registry.observe(view, (allocations.peak, allocations.net))
+        logger.info(
+            'Память %s %s: пик %d B, прирост %d B\n%s',
+            view, request.path, allocations.peak, allocations.net,
+            allocations.report(),
+        )
+        return response
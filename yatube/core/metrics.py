@@ -0,0 +1,322 @@
+"""Метрики запросов по вьюхам в формате Prometheus.
+
+MetricsMiddleware для каждого запроса считает число SQL-запросов,
+время в базе, время отрисовки шаблонов и полное время ответа и
+складывает их в гистограммы с меткой view - именем вьюхи из
+resolver_match. SQL считается обёрткой execute_wrapper, шаблоны -
+бэкендом TimedTemplates, так что DEBUG не нужен.
+
+Воркеров несколько, а Prometheus попадает в случайный, поэтому
+каждый воркер копит наблюдения в памяти и не реже раза
+в METRICS_FLUSH_INTERVAL секунд прибавляет их к строкам общего
+файла SQLite METRICS_PATH. registry.text() отдаёт для /-/metrics/
+сумму по всем воркерам; наблюдения последнего интервала
+остановленного воркера теряются.
+"""
+import logging
+import os
+import sqlite3
+import threading
+from bisect import bisect_left
+from contextlib import ExitStack
+from contextvars import ContextVar
+from time import monotonic, perf_counter
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+METRICS = (
+    ('yatube_view_queries', 'SQL-запросов за запрос', QUERY_BUCKETS),
+    ('yatube_view_db_seconds', 'Время в базе, с', LATENCY_BUCKETS),
+    ('yatube_view_render_seconds', 'Отрисовка шаблонов, с',
+     LATENCY_BUCKETS),
+    ('yatube_view_latency_seconds', 'Полное время ответа, с',
+     LATENCY_BUCKETS),
+)
+UNRESOLVED = 'unresolved'
+# Номер «корзины», под которым в общем файле лежит сумма значений.
+SUM_BUCKET = -1
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('request_stats', default=None)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Гистограммы метрик по вьюхам.
+
+    Метрика без корзин (buckets None) - счётчик: наблюдения
+    складываются. С shared наблюдения общие для всех воркеров,
+    см. описание модуля; без него живут только в памяти процесса.
+    """
+
+    def __init__(self, metrics=METRICS, shared=False):
+        self.metrics = metrics
+        self.shared = shared
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._flush_at = 0
+
+    def _path(self):
+        return settings.METRICS_PATH if self.shared else None
+
+    def _connection(self, path):
+        # После fork соединение родителя использовать нельзя.
+        key = (os.getpid(), path)
+        if getattr(self._local, 'key', None) != key:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                path, timeout=10, isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            # value без типа: целые суммы остаются целыми.
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS histogram ('
+                'name TEXT, view TEXT, bucket INTEGER, value NOT NULL, '
+                'PRIMARY KEY (name, view, bucket)) WITHOUT ROWID'
+            )
+            self._local.connection = connection
+            self._local.key = key
+        return self._local.connection
+
+    def observe(self, view, values):
+        """values - значения метрик в порядке metrics."""
+        with self._lock:
+            for (name, _, buckets), value in zip(self.metrics, values):
+                histogram = self._histograms.get((name, view))
+                if histogram is None:
+                    histogram = Histogram(buckets or ())
+                    self._histograms[name, view] = histogram
+                histogram.observe(value)
+            due = self.shared and monotonic() >= self._flush_at
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Прибавляет накопленное воркером к общему файлу."""
+        path = self._path()
+        if path is None:
+            return
+        with self._lock:
+            histograms, self._histograms = self._histograms, {}
+            self._flush_at = monotonic() + settings.METRICS_FLUSH_INTERVAL
+        rows = []
+        for (name, view), histogram in histograms.items():
+            rows.append((name, view, SUM_BUCKET, histogram.sum))
+            rows.extend(
+                (name, view, bucket, count)
+                for bucket, count in enumerate(histogram.counts) if count
+            )
+        if not rows:
+            return
+        try:
+            connection = self._connection(path)
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                connection.executemany(
+                    'INSERT INTO histogram (name, view, bucket, value) '
+                    'VALUES (?, ?, ?, ?) ON CONFLICT (name, view, bucket) '
+                    'DO UPDATE SET value = value + excluded.value',
+                    rows
+                )
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+        except sqlite3.Error:
+            # Метрики не стоят упавшего ответа.
+            logger.exception('Не удалось записать метрики')
+
+    def _load(self, path):
+        buckets = {name: buckets for name, _, buckets in self.metrics}
+        rows = self._connection(path).execute(
+            'SELECT name, view, bucket, value FROM histogram '
+            'WHERE name IN ({})'.format(', '.join('?' * len(buckets))),
+            tuple(buckets)
+        )
+        histograms = {}
+        for name, view, bucket, value in rows:
+            histogram = histograms.get((name, view))
+            if histogram is None:
+                histogram = Histogram(buckets[name] or ())
+                histograms[name, view] = histogram
+            if bucket == SUM_BUCKET:
+                histogram.sum = value
+            else:
+                histogram.counts[bucket] = value
+                histogram.count += value
+        return histograms
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+        path = self._path()
+        if path is not None:
+            self._connection(path).execute(
+                'DELETE FROM histogram WHERE name IN ({})'.format(
+                    ', '.join('?' * len(self.metrics))
+                ),
+                tuple(name for name, _, _ in self.metrics)
+            )
+
+    def text(self):
+        """Все гистограммы в текстовом формате Prometheus."""
+        path = self._path()
+        if path is None:
+            with self._lock:
+                return self._render(self._histograms)
+        self.flush()
+        return self._render(self._load(path))
+
+    def _render(self, histograms):
+        lines = []
+        for name, help_text, buckets in self.metrics:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append('# TYPE {} {}'.format(
+                name, 'counter' if buckets is None else 'histogram'
+            ))
+            views = sorted(
+                view for metric, view in histograms if metric == name
+            )
+            for view in views:
+                histogram = histograms[name, view]
+                label = 'view="{}"'.format(_escape(view))
+                if buckets is None:
+                    lines.append(f'{name}{{{label}}} {histogram.sum}')
+                    continue
+                total = 0
+                for bound, count in zip(
+                    (*buckets, '+Inf'), histogram.counts
+                ):
+                    total += count
+                    lines.append(
+                        f'{name}_bucket{{{label},le="{bound}"}} {total}'
+                    )
+                lines.append(f'{name}_sum{{{label}}} {histogram.sum}')
+                lines.append(f'{name}_count{{{label}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return (
+        value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    )
+
+
+def percentile(values, share):
+    """Перцентиль выборки, share от 0 до 1.
+
+    Между соседними значениями - линейная интерполяция, как
+    у statistics.quantiles(method='inclusive'), которой нет до 3.8.
+    """
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * share
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+registry = Registry(shared=True)
+# Всё, что отдаёт /-/metrics/; модули добавляют сюда свои реестры.
+registries = [registry]
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0
+        self.render_time = 0
+        self.render_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += perf_counter() - start
+            self.queries += 1
+
+
+class MetricsMiddleware:
+    """Пишет метрики каждого запроса в registry."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else UNRESOLVED
+        registry.observe(view, (
+            stats.queries,
+            stats.db_time,
+            stats.render_time,
+            perf_counter() - start,
+        ))
+        return response
+
+
+class TimedTemplate:
+    """Шаблон Django, время отрисовки которого идёт в метрики."""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        if stats is None:
+            return self.template.render(context, request)
+        # Вложенные render_to_string уже учтены во внешнем.
+        stats.render_depth += 1
+        start = perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            stats.render_depth -= 1
+            if not stats.render_depth:
+                stats.render_time += perf_counter() - start
+
+
+class TimedTemplates(DjangoTemplates):
+    """DjangoTemplates, отдающий TimedTemplate."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
@@ -0,0 +1,176 @@
+"""Выборочное профилирование запросов в продакшене.
+
+ProfilerMiddleware профилирует долю PROFILER_SAMPLE_RATE запросов,
+запросы к вьюхам из PROFILER_VIEWS и запросы с заголовком
+X-Profile, равным PROFILER_TOKEN. Пока запрос выполняется, отдельный
+поток раз в PROFILER_INTERVAL секунд снимает стек его потока;
+стеки пишутся в свёрнутом виде (collapsed stacks), который понимают
+flamegraph.pl, speedscope и inferno. Рядом пишется SQL запроса
+с временем каждого выражения, но без параметров. Для каждой вьюхи
+хранится не больше PROFILER_MAX_FILES последних профилей.
+"""
+import logging
+import os
+import random
+import sys
+import threading
+from collections import Counter
+from contextlib import ExitStack
+from time import perf_counter, time_ns
+
+from django.conf import settings
+from django.db import connections
+from django.urls import Resolver404, resolve
+from django.utils.crypto import constant_time_compare
+
+from .metrics import UNRESOLVED
+
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'HTTP_X_PROFILE'
+
+
+class StackSampler(threading.Thread):
+    """Снимает стек потока thread_id, пока не вызван stop."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[_collapse(frame)] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+def _collapse(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append('{}:{}'.format(
+            frame.f_globals.get('__name__', code.co_filename), code.co_name
+        ))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class QueryLog:
+    """execute_wrapper, запоминающий SQL и время без параметров."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((perf_counter() - start, sql))
+
+
+def write_profile(directory, view, stacks, queries, header, max_files):
+    """Пишет профиль в directory/<view>/ и удаляет самые старые."""
+    view_dir = os.path.join(directory, view.replace(':', '.'))
+    os.makedirs(view_dir, exist_ok=True)
+    stem = os.path.join(
+        view_dir, '{:020d}-{}'.format(time_ns(), os.getpid())
+    )
+    _write(stem + '.sql', [f'-- {header}'] + [
+        f'-- {duration * 1000:.2f} ms\n{sql};' for duration, sql in queries
+    ])
+    # .folded появляется последним: по нему профиль считается готовым.
+    _write(stem + '.folded', [
+        f'{stack} {count}' for stack, count in stacks.most_common()
+    ])
+    profiles = sorted(
+        name[:-len('.folded')] for name in os.listdir(view_dir)
+        if name.endswith('.folded')
+    )
+    for old in profiles[:-max_files]:
+        for ext in ('.folded', '.sql'):
+            try:
+                os.remove(os.path.join(view_dir, old + ext))
+            except FileNotFoundError:
+                pass
+    return stem
+
+
+def _write(path, lines):
+    with open(path + '.tmp', 'w') as file:
+        file.write('\n'.join(lines) + '\n')
+    os.replace(path + '.tmp', path)
+
+
+def view_name(request):
+    """Имя вьюхи запроса, в том числе до разбора URL в обработчике."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return UNRESOLVED
+    return match.view_name
+
+
+def sampled(request, rate, views, header=HEADER):
+    """Выбран ли запрос: по заголовку с токеном, доле или вьюхе."""
+    # За прокси REMOTE_ADDR у всех 127.0.0.1, поэтому профиль
+    # по заголовку включает только знающий PROFILER_TOKEN.
+    token = settings.PROFILER_TOKEN
+    if token and constant_time_compare(request.META.get(header, ''), token):
+        return True
+    if random.random() < rate:
+        return True
+    return bool(views) and view_name(request) in views
+
+
+class ProfilerMiddleware:
+    """Профилирует выбранные запросы, см. описание модуля."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not sampled(
+            request, settings.PROFILER_SAMPLE_RATE, settings.PROFILER_VIEWS
+        ):
+            return self.get_response(request)
+        log = QueryLog()
+        sampler = StackSampler(
+            threading.get_ident(), settings.PROFILER_INTERVAL
+        )
+        start = perf_counter()
+        sampler.start()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(log))
+                response = self.get_response(request)
+        finally:
+            sampler.stop()
+        elapsed = perf_counter() - start
+        try:
+            write_profile(
+                settings.PROFILER_DIR,
+                view_name(request),
+                sampler.stacks,
+                log.queries,
+                '{} {} {} {:.1f} ms'.format(
+                    request.method, request.path, response.status_code,
+                    elapsed * 1000
+                ),
+                settings.PROFILER_MAX_FILES,
+            )
+        except OSError:
+            # Профиль не стоит упавшего ответа.
+            logger.exception('Не удалось записать профиль запроса')
+        return response
@@ -0,0 +1,34 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+class TempFilesRunner(DiscoverRunner):
+    """Тесты работают с кэшем и метриками во временном каталоге.
+
+    Иначе cache.clear() и registry.clear() в тестах очищали бы общие
+    файлы запущенного на той же машине сайта.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache_settings = override_settings(
+            CACHES={
+                alias: {**params, 'LOCATION': os.path.join(
+                    self.cache_dir, f'{alias}.sqlite3'
+                )}
+                for alias, params in settings.CACHES.items()
+            },
+            METRICS_PATH=os.path.join(self.cache_dir, 'metrics.sqlite3'),
+        )
+        self.cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache_settings.disable()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
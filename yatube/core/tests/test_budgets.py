@@ -0,0 +1,149 @@
+from collections import namedtuple
+from http import HTTPStatus
+
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from about import urls as about_urls
+from posts import urls as posts_urls
+from posts.models import Comment, Follow, Group, Post, User
+from users import urls as users_urls
+
+# Бюджет маршрута: сколько SQL-запросов и байт ответа допустимо
+# при холодном кэше. kwargs строит аргументы URL по данным теста,
+# data - тело POST-запроса.
+Budget = namedtuple(
+    'Budget', 'queries bytes kwargs method data',
+    defaults=(None, 'get', None)
+)
+
+BUDGETS = {
+    'posts:posts_index': Budget(3, 11_000),
+    'posts:group_list': Budget(
+        4, 10_000, lambda test: {'slug': test.group.slug}
+    ),
+    'posts:profile': Budget(
+        5, 9_000, lambda test: {'username': test.reader.username}
+    ),
+    'posts:search': Budget(4, 11_000, data={'q': 'Пост'}),
+    'posts:post_detail': Budget(
+        4, 15_000, lambda test: {'post_id': test.post.pk}
+    ),
+    'posts:post_create': Budget(3, 7_000),
+    'posts:post_edit': Budget(
+        5, 7_000, lambda test: {'post_id': test.post.pk}
+    ),
+    'posts:post_comments': Budget(
+        2, 8_000, lambda test: {'post_id': test.post.pk}
+    ),
+    'posts:add_comment': Budget(
+        5, 0, lambda test: {'post_id': test.post.pk}, 'post',
+        {'text': 'Ещё комментарий'}
+    ),
+    'posts:follow_index': Budget(4, 10_000),
+    'posts:profile_follow': Budget(
+        12, 0, lambda test: {'username': test.stranger.username}
+    ),
+    'posts:profile_unfollow': Budget(
+        10, 0, lambda test: {'username': test.stranger.username}
+    ),
+    'users:signup': Budget(2, 9_000),
+    'users:logout': Budget(4, 4_000),
+    'users:login': Budget(2, 6_000),
+    'users:password_change': Budget(2, 7_000),
+    'users:password_change_done': Budget(2, 4_000),
+    'users:password_reset': Budget(2, 5_000),
+    'users:password_reset_done': Budget(2, 4_000),
+    'users:password_reset_confirm': Budget(5, 0, lambda test: {
+        'uidb64': urlsafe_base64_encode(force_bytes(test.reader.pk)),
+        'token': default_token_generator.make_token(test.reader),
+    }),
+    'users:reset_done': Budget(2, 4_000),
+    'about:author': Budget(2, 4_000),
+    'about:tech': Budget(2, 5_000),
+}
+
+# Размеры данных: сколько авторов, постов в лентах и профиле
+# и комментариев к посту.
+SIZES = (1, 10, 25)
+
+
+class QueryBudgetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.stranger = User.objects.create_user(username='stranger')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            text='Пост читателя', author=cls.reader, group=cls.group
+        )
+        # Строки счётчиков появляются при первой подписке; без этого
+        # первый замер profile_follow дороже остальных.
+        Follow.objects.create(user=cls.reader, author=cls.stranger).delete()
+
+    def setUp(self):
+        cache.clear()
+        self.writers = []
+
+    def grow(self, size):
+        """Доводит число авторов, постов и комментариев до size."""
+        for index in range(len(self.writers), size):
+            writer = User.objects.create_user(username=f'writer_{index}')
+            Follow.objects.create(user=self.reader, author=writer)
+            Post.objects.create(
+                text=f'Пост {index}', author=writer, group=self.group
+            )
+            Post.objects.create(
+                text=f'Пост читателя {index}', author=self.reader
+            )
+            Comment.objects.create(
+                post=self.post, author=writer, text=f'Комментарий {index}'
+            )
+            self.writers.append(writer)
+
+    def measure(self, name, budget):
+        client = Client()
+        client.force_login(self.reader)
+        url = reverse(name, kwargs=budget.kwargs and budget.kwargs(self))
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(client, budget.method)(url, budget.data)
+        # Журнал запросов очистит следующий запрос клиента.
+        return len(queries), len(response.content), response.status_code
+
+    def test_every_route_has_budget(self):
+        """У каждого маршрута posts, users и about есть бюджет"""
+        routes = {
+            f'{module.app_name}:{pattern.name}'
+            for module in (posts_urls, users_urls, about_urls)
+            for pattern in module.urlpatterns
+        }
+        self.assertEqual(routes, set(BUDGETS))
+
+    def test_routes_within_budget(self):
+        """Маршруты укладываются в бюджет, запросы не растут с данными"""
+        counts = {}
+        for size in SIZES:
+            self.grow(size)
+            for name, budget in BUDGETS.items():
+                with self.subTest(view=name, size=size):
+                    queries, length, status = self.measure(name, budget)
+                    counts.setdefault(name, {})[size] = queries
+                    self.assertLess(status, HTTPStatus.BAD_REQUEST)
+                    self.assertLessEqual(queries, budget.queries)
+                    self.assertLessEqual(length, budget.bytes)
+        for name, by_size in counts.items():
+            with self.subTest(view=name):
+                self.assertEqual(
+                    len(set(by_size.values())), 1,
+                    f'Число запросов растёт с данными: {by_size}'
+                )
@@ -0,0 +1,114 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from ..cache import SQLiteCache, TwoTierCache
+
+
+class TwoTierCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def worker(self, **options):
+        return TwoTierCache(self.location, {'OPTIONS': options})
+
+    def test_shared_between_workers(self):
+        """Запись одного воркера видна другому"""
+        first, second = self.worker(), self.worker()
+        first.set('key', 'value')
+        self.assertEqual(second.get('key'), 'value')
+        self.assertIsNotNone(SQLiteCache(self.location, {}).get('key'))
+
+    def test_stamp_invalidates_local_copy(self):
+        """Локальная копия сверяется со штампом после SYNC_INTERVAL"""
+        writer = self.worker()
+        lazy = self.worker(SYNC_INTERVAL=3600)
+        eager = self.worker(SYNC_INTERVAL=0)
+        writer.set('key', 'old')
+        self.assertEqual(lazy.get('key'), 'old')
+        self.assertEqual(eager.get('key'), 'old')
+        writer.set('key', 'new')
+        self.assertEqual(lazy.get('key'), 'old')
+        self.assertEqual(eager.get('key'), 'new')
+        writer.delete('key')
+        self.assertIsNone(eager.get('key'))
+
+    def test_get_many_matches_get(self):
+        """get_many сверяет штампы так же, как get"""
+        writer = self.worker()
+        reader = self.worker(SYNC_INTERVAL=0)
+        writer.set_many({'a': 1, 'b': 2, 'c': 3})
+        self.assertEqual(
+            reader.get_many(['a', 'b', 'missing']), {'a': 1, 'b': 2}
+        )
+        writer.set('a', 10)
+        writer.delete('b')
+        self.assertEqual(reader.get_many(['a', 'b', 'c']), {'a': 10, 'c': 3})
+        self.assertEqual(reader.get('b'), None)
+
+    def test_local_lru_is_bounded(self):
+        """Локальный уровень вытесняет давно не читанные записи"""
+        cache = self.worker(LOCAL_MAX_ENTRIES=2, LOCAL_MAX_BYTES=10 ** 6)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(list(cache._entries), [
+            cache.make_key('a'), cache.make_key('c')
+        ])
+        self.assertEqual(cache.get('b'), 2)
+
+        small = self.worker(LOCAL_MAX_BYTES=100)
+        small.set('big', 'x' * 1000)
+        self.assertEqual(small._bytes, 0)
+        self.assertEqual(small.get('big'), 'x' * 1000)
+
+    def test_add_and_expiry(self):
+        """add атомарен между воркерами, истёкшие записи не отдаются"""
+        first, second = self.worker(), self.worker()
+        self.assertTrue(first.add('lock', 1, 30))
+        self.assertFalse(second.add('lock', 1, 30))
+        first.delete('lock')
+        self.assertTrue(second.add('lock', 1, 30))
+        first.set('gone', 1, 0)
+        self.assertIsNone(second.get('gone'))
+        self.assertIsNone(first.get('gone'))
+
+    def test_cull_keeps_entries_without_expiry(self):
+        """При вытеснении бессрочные записи остаются"""
+        cache = SQLiteCache(self.location, {'OPTIONS': {'MAX_ENTRIES': 5}})
+        cache.cull_every = 1
+        cache.set('version', 1, None)
+        for index in range(10):
+            cache.set(f'page:{index}', index, 60)
+        self.assertEqual(cache.get('version'), 1)
+        self.assertIsNone(cache.get('page:0'))
+
+    def test_uses_temporary_location(self):
+        """Тесты не трогают файл кэша запущенного сайта"""
+        self.assertNotEqual(
+            caches['default'].shared._path,
+            os.path.join(settings.BASE_DIR, 'cache', 'cache.sqlite3')
+        )
+
+    def test_benchmark_reports_every_backend(self):
+        """Бенчмарк отчитывается по каждому кэшу и числу воркеров"""
+        out = StringIO()
+        call_command(
+            'benchmark_cache', workers=[1, 2], requests=40, keys=5, size=10,
+            stdout=out
+        )
+        report = json.loads(out.getvalue())
+        self.assertEqual(len(report), 6)
+        self.assertTrue(all(0 <= row['hit_ratio'] <= 1 for row in report))
@@ -0,0 +1,60 @@
+import tracemalloc
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import override_settings, TestCase
+from django.urls import reverse
+
+from posts.models import User
+
+from .. import memory
+from ..memory import allocation_budget, memory_registry, track_allocations
+
+
+class MemoryTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        memory_registry.clear()
+
+    @override_settings(MEMORY_VIEWS=['posts:profile'], METRICS_TOKEN='secret')
+    def test_sampled_view_measured(self):
+        """Память выбранной вьюхи попадает в метрики"""
+        user = User.objects.create_user(username='post_author')
+        self.client.get(reverse('posts:posts_index'))
+        self.client.get(reverse('posts:profile', args=[user.username]))
+        text = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret'
+        ).content.decode()
+        self.assertIn(
+            'yatube_view_memory_peak_bytes_count{view="posts:profile"} 1',
+            text
+        )
+        self.assertNotIn(
+            'yatube_view_memory_peak_bytes_count{view="posts:posts_index"}',
+            text
+        )
+
+    def test_budget_exceeded(self):
+        """Превышение бюджета называет место выделения"""
+        with self.assertRaisesRegex(AssertionError, 'test_memory.py:'):
+            with allocation_budget(1024):
+                data = [bytearray(1024) for _ in range(100)]
+        self.assertEqual(len(data), 100)
+
+    def test_peak_without_reset_peak(self):
+        """Без reset_peak (Python до 3.9) пик всё равно считается"""
+        with mock.patch.object(memory.tracemalloc, 'reset_peak', None):
+            with track_allocations() as allocations:
+                data = bytearray(256 * 1024)
+                del data
+            self.assertGreaterEqual(allocations.peak, 256 * 1024)
+            self.assertLess(allocations.net, 256 * 1024)
+            tracemalloc.start()
+            try:
+                with track_allocations() as allocations:
+                    data = bytearray(256 * 1024)
+            finally:
+                tracemalloc.stop()
+        self.assertEqual(len(data), 256 * 1024)
+        self.assertGreaterEqual(allocations.peak, 256 * 1024)
+        self.assertGreaterEqual(allocations.peak, allocations.net)
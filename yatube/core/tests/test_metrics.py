@@ -0,0 +1,118 @@
+import re
+from http import HTTPStatus
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Post, User
+
+from ..metrics import percentile, Registry, registry
+
+
+def sample(text, name, view):
+    match = re.search(
+        r'^{}{{view="{}"}} (\S+)$'.format(re.escape(name), re.escape(view)),
+        text,
+        re.MULTILINE,
+    )
+    return match and float(match.group(1))
+
+
+@override_settings(METRICS_TOKEN='secret')
+class MetricsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='post_author')
+        Post.objects.create(text='Текст', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        registry.clear()
+
+    def test_view_metrics_exported(self):
+        """Число запросов и времена попадают в метрики вьюхи"""
+        url = reverse('posts:profile', args=[self.user.username])
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        # Следующий запрос очистит журнал запросов соединения.
+        count = len(queries)
+        cache.clear()
+        self.client.get(url)
+        text = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret'
+        ).content.decode()
+        view = 'posts:profile'
+        self.assertEqual(
+            sample(text, 'yatube_view_latency_seconds_count', view), 2
+        )
+        self.assertEqual(
+            sample(text, 'yatube_view_queries_sum', view), 2 * count
+        )
+        self.assertGreater(sample(text, 'yatube_view_db_seconds_sum', view), 0)
+        self.assertGreater(
+            sample(text, 'yatube_view_render_seconds_sum', view), 0
+        )
+        self.assertIn(
+            'yatube_view_latency_seconds_bucket'
+            '{view="posts:profile",le="+Inf"} 2',
+            text,
+        )
+
+    def test_metrics_need_token(self):
+        """Без токена метрики не отдаются, даже с 127.0.0.1"""
+        url = reverse('metrics')
+        for headers in (
+            {},
+            {'HTTP_AUTHORIZATION': 'Bearer wrong'},
+            {'HTTP_AUTHORIZATION': 'secret'},
+        ):
+            with self.subTest(headers=headers):
+                response = self.client.get(
+                    url, REMOTE_ADDR='127.0.0.1', **headers
+                )
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        with override_settings(METRICS_TOKEN=''):
+            response = self.client.get(url, HTTP_AUTHORIZATION='Bearer ')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_workers_aggregated(self):
+        """Каждый воркер видит наблюдения всех воркеров"""
+        metrics = (('m', 'тест', (1, 5)),)
+        first = Registry(metrics, shared=True)
+        second = Registry(metrics, shared=True)
+        first.clear()
+        self.addCleanup(first.clear)
+        first.observe('view', (3,))
+        second.observe('view', (10,))
+        # Второе наблюдение ждёт в памяти воркера до сброса.
+        second.observe('view', (0,))
+        self.assertIn('m_count{view="view"} 2', first.text())
+        text = second.text()
+        self.assertIn('m_bucket{view="view",le="5"} 2', text)
+        self.assertIn('m_sum{view="view"} 13', text)
+        self.assertIn('m_count{view="view"} 3', text)
+        self.assertIn('m_count{view="view"} 3', first.text())
+
+    def test_buckets_are_cumulative(self):
+        """Корзины гистограммы накопительные, метки экранируются"""
+        local = Registry((('m', 'тест', (1, 5)),))
+        for value in (0, 3, 3, 10):
+            local.observe('a"b', (value,))
+        text = local.text()
+        self.assertIn('m_bucket{view="a\\"b",le="1"} 1', text)
+        self.assertIn('m_bucket{view="a\\"b",le="5"} 3', text)
+        self.assertIn('m_bucket{view="a\\"b",le="+Inf"} 4', text)
+        self.assertIn('m_sum{view="a\\"b"} 16', text)
+
+    def test_percentile(self):
+        """Перцентиль интерполирует между соседними значениями"""
+        values = [5, 1, 4, 2, 3]
+        self.assertEqual(percentile(values, 0), 1)
+        self.assertEqual(percentile(values, 0.5), 3)
+        self.assertEqual(percentile(values, 1), 5)
+        self.assertAlmostEqual(percentile(values, 0.95), 4.8)
+        self.assertEqual(percentile([7], 0.99), 7)
@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import override_settings, TestCase
+from django.urls import reverse
+
+from posts.models import Post, User
+
+from ..profiling import write_profile
+
+
+TEMP_PROFILER_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(
+    PROFILER_DIR=TEMP_PROFILER_DIR,
+    PROFILER_VIEWS=['posts:profile'],
+    PROFILER_INTERVAL=0.0005,
+    PROFILER_MAX_FILES=2,
+)
+class ProfilerTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='post_author')
+        Post.objects.create(text='Текст', author=cls.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_PROFILER_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        shutil.rmtree(TEMP_PROFILER_DIR, ignore_errors=True)
+
+    def profiles(self, view):
+        directory = os.path.join(TEMP_PROFILER_DIR, view)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(os.listdir(directory))
+
+    def test_view_profiled_into_ring(self):
+        """Профили вьюхи пишутся с SQL, старые удаляются"""
+        url = reverse('posts:profile', args=[self.user.username])
+        for _ in range(3):
+            cache.clear()
+            self.client.get(url)
+        names = self.profiles('posts.profile')
+        self.assertEqual(len(names), 4)
+        self.assertEqual(
+            {os.path.splitext(name)[1] for name in names},
+            {'.folded', '.sql'}
+        )
+        sql_name = next(name for name in names if name.endswith('.sql'))
+        with open(os.path.join(
+            TEMP_PROFILER_DIR, 'posts.profile', sql_name
+        )) as file:
+            sql = file.read()
+        self.assertTrue(sql.startswith('-- GET {} 200'.format(url)))
+        self.assertIn('SELECT', sql)
+        self.assertEqual(self.profiles('posts.posts_index'), [])
+
+    def test_header_needs_token(self):
+        """Заголовок X-Profile действует только с PROFILER_TOKEN"""
+        url = reverse('posts:posts_index')
+        self.client.get(url, HTTP_X_PROFILE='1')
+        with override_settings(PROFILER_TOKEN='secret'):
+            self.client.get(url, HTTP_X_PROFILE='wrong')
+            self.assertEqual(self.profiles('posts.posts_index'), [])
+            self.client.get(url, HTTP_X_PROFILE='secret')
+        self.assertEqual(len(self.profiles('posts.posts_index')), 2)
+
+    def test_collapsed_stacks_format(self):
+        """Стеки пишутся в формате flamegraph: стек и число"""
+        stem = write_profile(
+            TEMP_PROFILER_DIR, 'posts:index',
+            Counter({'a:main;b:view': 3, 'a:main': 1}),
+            [(0.001, 'SELECT 1')], 'GET / 200', 1,
+        )
+        with open(stem + '.folded') as file:
+            self.assertEqual(file.read(), 'a:main;b:view 3\na:main 1\n')
@@ -1,4 +1,9 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+
+from .metrics import registries
 
 
 def page_not_found(request, exception):
@@ -11,3 +16,19 @@ def csrf_failure(request, reason=''):
 
 def server_error(request):
     return render(request, 'core/500.html', status=500)
+
+
+def metrics(request):
+    """Метрики для Prometheus; нужен заголовок с METRICS_TOKEN.
+
+    Prometheus передаёт токен как Authorization: Bearer <токен>.
+    """
+    token = settings.METRICS_TOKEN
+    if not token or not constant_time_compare(
+        request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'
+    ):
+        raise Http404
+    return HttpResponse(
+        ''.join(registry.text() for registry in registries),
+        content_type='text/plain; version=0.0.4',
+    )
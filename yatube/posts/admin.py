@@ -1,6 +1,11 @@
 from django.contrib import admin
 
 from .models import Comment, Follow, Group, Post
+from .utils.search import (
+    filter_matching,
+    fts_available,
+    match_expression
+)
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -16,6 +21,21 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def save_model(self, request, obj, form, change):
+        # Как и PostForm: правка не затирает comments_count.
+        if change:
+            obj.save(update_fields=form.changed_data)
+        else:
+            obj.save()
+
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по индексу FTS5 вместо LIKE '%...%' по всей таблице.
+        if not fts_available() or not match_expression(search_term):
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        return filter_matching(queryset, search_term), False
+
 
 admin.site.register(Post, PostAdmin)
 
@@ -1,6 +1,11 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+from PIL import Image
 
 from .models import Comment, Post
+from .utils.images import image_placeholder, normalize_upload
+from .utils.thumbnails import pregenerate_thumbnails
 
 
 class PostForm(forms.ModelForm):
@@ -12,6 +17,44 @@ class PostForm(forms.ModelForm):
             'text': 'Текст нового поста',
             'group': 'Группа, к которой будет относиться пост'}
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            try:
+                return normalize_upload(image)
+            except (OSError, ValueError, Image.DecompressionBombError):
+                # Заголовок ImageField проверил, а данные файла битые.
+                raise forms.ValidationError(
+                    'Не удалось прочитать картинку: файл повреждён.',
+                    code='invalid_image',
+                )
+        return image
+
+    def save(self, commit=True):
+        if 'image' in self.changed_data:
+            self.instance.image_placeholder = image_placeholder(
+                self.cleaned_data['image']
+            )
+        if not commit:
+            return super().save(commit)
+        # Загрузка, пост и его ссылка на файл - одна транзакция:
+        # до её конца файл держит media.pin.
+        with transaction.atomic():
+            if self.instance._state.adding:
+                post = super().save(commit)
+            else:
+                # Правка пишет только поля формы: comments_count тем
+                # временем меняют через F(), и устаревшее значение
+                # экземпляра его бы затёрло.
+                post = super().save(commit=False)
+                post.save(
+                    update_fields=[*self._meta.fields, 'image_placeholder']
+                )
+                self.save_m2m()
+        if 'image' in self.changed_data:
+            pregenerate_thumbnails(post)
+        return post
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,59 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.utils.images import placeholder_bytes
+
+
+class Command(BaseCommand):
+    help = 'Считает заглушки картинок постов, у которых их нет.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Сколько процессов считают заглушки.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Сколько картинок читать в память за раз.',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересчитать и уже заполненные заглушки.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        posts = Post.objects.exclude(image='').exclude(image=None)
+        if not options['force']:
+            posts = posts.filter(image_placeholder='')
+        posts = posts.order_by('pk')
+        filled = last_pk = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                batch = list(posts.filter(pk__gt=last_pk)[:batch_size])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+                batch = [post for post in batch if post.image.storage.exists(
+                    post.image.name
+                )]
+                data = []
+                for post in batch:
+                    with post.image.open('rb') as image:
+                        data.append(image.read())
+                for post, placeholder in zip(
+                    batch, pool.map(placeholder_bytes, data)
+                ):
+                    if placeholder and placeholder != post.image_placeholder:
+                        post.image_placeholder = placeholder
+                        post.save(update_fields=['image_placeholder'])
+                        filled += 1
+        self.stdout.write(f'Заполнено заглушек: {filled}')
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.models import User
+from posts.utils.constants import TIMELINE_BATCH_SIZE
+from posts.utils.timeline import rebuild_timeline
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Пересобрать ленту только этого пользователя.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=TIMELINE_BATCH_SIZE,
+            help='Сколько записей ленты вставлять за один запрос.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(
+                    f'Пользователь {options["user"]} не найден'
+                )
+            user_ids = [user.pk]
+        else:
+            user_ids = User.objects.filter(
+                follower__isnull=False
+            ).distinct().values_list('pk', flat=True).iterator()
+        rebuilt = 0
+        for user_id in user_ids:
+            rebuild_timeline(user_id, batch_size)
+            rebuilt += 1
+        self.stdout.write(f'Пересобрано лент: {rebuilt}')
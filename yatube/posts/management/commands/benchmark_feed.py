@@ -0,0 +1,74 @@
+import json
+from statistics import median
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.models import Post, User
+from posts.utils.constants import POST_ORDERING, QUANTITY_OF_POSTS
+from posts.utils.paginator import CursorPaginator
+from posts.utils.timeline import hybrid_paginator, pulled_authors
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает время чтения ленты подписок: соединение с Follow, '
+        'готовая лента (push) и слияние постов авторов при чтении (pull).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument(
+            '--pages',
+            type=int,
+            default=3,
+            help='Сколько страниц пролистывать за один прогон.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(
+                f'Пользователь {options["username"]} не найден'
+            )
+        authors = list(
+            user.follower.values_list('author_id', flat=True)
+        )
+        paginators = {
+            'join': CursorPaginator(
+                Post.objects.filter(
+                    author__following__user=user
+                ).select_related('author', 'group'),
+                QUANTITY_OF_POSTS,
+                POST_ORDERING,
+            ),
+            'push': hybrid_paginator(
+                user, pulled_authors(user.pk), QUANTITY_OF_POSTS
+            ),
+            'pull': hybrid_paginator(
+                user, authors, QUANTITY_OF_POSTS, use_timeline=False
+            ),
+        }
+        report = {'authors': len(authors)}
+        for name, paginator in paginators.items():
+            timings = [
+                self.walk(paginator, options['pages'])
+                for _ in range(options['repeat'])
+            ]
+            report[name] = {
+                'median_ms': round(median(timings) * 1000, 3),
+                'max_ms': round(max(timings) * 1000, 3),
+            }
+        self.stdout.write(json.dumps(report, indent=2))
+
+    @staticmethod
+    def walk(paginator, pages):
+        start = perf_counter()
+        page = paginator.get_page()
+        for _ in range(pages - 1):
+            if not page.has_next():
+                break
+            page = paginator.get_page(page.next_cursor)
+        return perf_counter() - start
@@ -0,0 +1,142 @@
+import json
+import random
+from itertools import accumulate
+from statistics import median
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max
+
+from posts.models import Post, User
+from posts.utils.constants import POST_ORDERING, QUANTITY_OF_POSTS
+from posts.utils.search import (
+    SearchPaginator,
+    filter_matching,
+    fts_available
+)
+
+
+WORD_LENGTHS = (3, 12)
+LETTERS = 'абвгдеёжзийклмнопрстуфхцчшщъыьэюя'
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает поиск по индексу FTS5 с LIKE по тексту постов. '
+        'С --fill недостающие посты досоздаются случайным текстом '
+        'и в конце удаляются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--posts',
+            type=int,
+            default=1_000_000,
+            help='Сколько постов должно быть в базе с --fill.',
+        )
+        parser.add_argument(
+            '--fill',
+            action='store_true',
+            help='Досоздать недостающие посты от пользователя '
+                 'search_benchmark; после замеров они удаляются.',
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--queries', type=int, default=5)
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if not fts_available():
+            raise CommandError('Индекс FTS5 есть только в SQLite')
+        rng = random.Random(options['seed'])
+        vocabulary = [
+            ''.join(rng.choices(LETTERS, k=rng.randint(*WORD_LENGTHS)))
+            for _ in range(20_000)
+        ]
+        if not options['fill'] and not Post.objects.exists():
+            raise CommandError(
+                'Нет постов: запустите generate_data или добавьте --fill'
+            )
+        self.author = None
+        try:
+            if options['fill']:
+                self.fill(
+                    options['posts'], options['batch_size'], vocabulary, rng
+                )
+            report = self.measure(vocabulary, rng, options)
+        finally:
+            self.clean()
+        self.stdout.write(json.dumps(report, indent=2, ensure_ascii=False))
+
+    def measure(self, vocabulary, rng, options):
+        queries = rng.sample(vocabulary[:1000], options['queries'])
+        posts = Post.objects.select_related('author', 'group')
+        paths = {
+            'fts': lambda query: list(SearchPaginator(
+                posts, query, QUANTITY_OF_POSTS
+            ).get_page()),
+            'like': lambda query: list(posts.filter(
+                text__icontains=query
+            ).order_by(*POST_ORDERING)[:QUANTITY_OF_POSTS]),
+            'fts_admin_count': lambda query: filter_matching(
+                Post.objects.all(), query
+            ).count(),
+            'like_admin_count': lambda query: Post.objects.filter(
+                text__icontains=query
+            ).count(),
+        }
+        report = {'posts': Post.objects.count(), 'queries': queries}
+        for name, run in paths.items():
+            timings = []
+            for _ in range(options['repeat']):
+                for query in queries:
+                    start = perf_counter()
+                    run(query)
+                    timings.append(perf_counter() - start)
+            report[name] = {
+                'median_ms': round(median(timings) * 1000, 3),
+                'max_ms': round(max(timings) * 1000, 3),
+            }
+        return report
+
+    def fill(self, total, batch_size, vocabulary, rng):
+        # bulk_create не вызывает сигналы: у автора нет подписчиков,
+        # а индекс поиска обновляют триггеры базы.
+        missing = total - Post.objects.count()
+        if missing <= 0:
+            return
+        self.last_post = Post.objects.aggregate(last=Max('pk'))['last'] or 0
+        author, self.created = User.objects.get_or_create(
+            username='search_benchmark'
+        )
+        self.author = author
+        # Частые слова в начале словаря, как в живом тексте.
+        weights = list(accumulate(
+            1 / (rank + 1) for rank in range(len(vocabulary))
+        ))
+        while missing > 0:
+            size = min(batch_size, missing)
+            Post.objects.bulk_create(
+                [
+                    Post(author=author, text=' '.join(rng.choices(
+                        vocabulary, cum_weights=weights, k=rng.randint(5, 60)
+                    )))
+                    for _ in range(size)
+                ]
+            )
+            missing -= size
+
+    def clean(self):
+        if self.author is None:
+            return
+        # Посты созданы без сигналов, и удалять их надо так же: иначе
+        # сигналы вычли бы из счётчиков то, чего в них не прибавляли.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {Post._meta.db_table} '
+                'WHERE author_id = %s AND id > %s',
+                [self.author.pk, self.last_post],
+            )
+        if self.created:
+            self.author.delete()
@@ -0,0 +1,228 @@
+import json
+import random
+from contextlib import ExitStack
+from statistics import mean
+from time import perf_counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count, Max
+from django.test import Client
+from django.urls import reverse
+
+from core.metrics import percentile, RequestStats
+from posts.models import Comment, Group, Post, User
+
+
+READS = ('index', 'group_posts', 'profile', 'post_detail', 'follow_index')
+WRITES = (
+    'post_create', 'post_edit', 'add_comment', 'profile_follow',
+    'profile_unfollow',
+)
+# Адрес не из INTERNAL_IPS: без debug toolbar, как у посетителя.
+REMOTE_ADDR = '192.0.2.1'
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет вьюхи постов через тестовый клиент и выводит JSON '
+        'с p50/p95/p99 времени ответа, числом SQL-запросов на запрос '
+        'и запросами в секунду. Данные готовит generate_data; '
+        'созданное пишущими вьюхами в конце удаляется.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Сколько запросов на каждую вьюху.',
+        )
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument(
+            '--views',
+            nargs='+',
+            choices=READS + WRITES,
+            default=READS + WRITES,
+        )
+        parser.add_argument(
+            '--cold',
+            action='store_true',
+            help='Очищать кэш перед каждым запросом.',
+        )
+        parser.add_argument(
+            '--user',
+            help='Читатель ленты и автор записей; по умолчанию '
+                 'пользователь с наибольшим числом подписок.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('Нужен хотя бы один запрос на вьюху')
+        if settings.DEBUG:
+            self.stderr.write(
+                'DEBUG включён: замеры будут хуже, чем в продакшене.'
+            )
+        self.rng = random.Random(options['seed'])
+        self.user = self.get_user(options['user'])
+        self.post_ids = list(Post.objects.values_list('pk', flat=True))
+        self.slugs = list(Group.objects.values_list('slug', flat=True))
+        self.authors = list(User.objects.filter(
+            stats__posts_count__gt=0
+        ).values_list('username', flat=True))
+        if not self.post_ids or not self.slugs:
+            raise CommandError(
+                'Нет постов или групп: сначала запустите generate_data'
+            )
+        self.strangers = list(User.objects.exclude(
+            following__user=self.user
+        ).exclude(pk=self.user.pk).values_list('username', flat=True)[:1000])
+        if not self.strangers and set(options['views']) & {
+            'profile_follow', 'profile_unfollow'
+        }:
+            raise CommandError('Пользователь уже подписан на всех авторов')
+        self.followed = []
+        self.client = Client(SERVER_NAME=self.host(), REMOTE_ADDR=REMOTE_ADDR)
+        self.client.force_login(self.user)
+        self.last_post = Post.objects.aggregate(
+            last=Max('pk')
+        )['last'] or 0
+        last_comment = Comment.objects.aggregate(
+            last=Max('pk')
+        )['last'] or 0
+        report = {
+            'posts': len(self.post_ids),
+            'user': self.user.username,
+            'cold': options['cold'],
+        }
+        try:
+            for name in options['views']:
+                report[name] = self.run(
+                    name, options['requests'], options['warmup'],
+                    options['cold'],
+                )
+        finally:
+            # Удаление через ORM: сигналы вернут счётчики и ленты.
+            Post.objects.filter(
+                author=self.user, pk__gt=self.last_post
+            ).delete()
+            Comment.objects.filter(
+                author=self.user, pk__gt=last_comment
+            ).delete()
+            self.user.follower.filter(
+                author__username__in=self.followed
+            ).delete()
+        self.stdout.write(json.dumps(report, indent=2, ensure_ascii=False))
+
+    def get_user(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'Пользователь {username} не найден')
+        user = User.objects.annotate(
+            follows=Count('follower')
+        ).order_by('-follows', 'pk').first()
+        if user is None:
+            raise CommandError('Нет пользователей: запустите generate_data')
+        return user
+
+    @staticmethod
+    def host():
+        for host in settings.ALLOWED_HOSTS:
+            host = host.lstrip('.')
+            if host and host != '*':
+                return host
+        return 'localhost'
+
+    def run(self, name, requests, warmup, cold):
+        # Вьюха отдаёт метод, адрес и данные запроса; подготовка
+        # не попадает ни во время, ни в число SQL-запросов.
+        prepare = getattr(self, name)
+        for _ in range(warmup):
+            self.send(*prepare())
+        timings, queries, errors = [], [], 0
+        for _ in range(requests):
+            request = prepare()
+            if cold:
+                cache.clear()
+            stats = RequestStats()
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                start = perf_counter()
+                response = self.send(*request)
+                timings.append(perf_counter() - start)
+            queries.append(stats.queries)
+            errors += response.status_code >= 400
+        return {
+            'requests': requests,
+            'p50_ms': round(percentile(timings, 0.5) * 1000, 3),
+            'p95_ms': round(percentile(timings, 0.95) * 1000, 3),
+            'p99_ms': round(percentile(timings, 0.99) * 1000, 3),
+            'queries_per_request': round(mean(queries), 2),
+            'max_queries': max(queries),
+            'requests_per_second': round(requests / sum(timings), 1),
+            'errors': errors,
+        }
+
+    def send(self, method, url, data=None):
+        return getattr(self.client, method)(url, data)
+
+    def index(self):
+        return 'get', reverse('posts:posts_index')
+
+    def group_posts(self):
+        return 'get', reverse(
+            'posts:group_list', args=[self.rng.choice(self.slugs)]
+        )
+
+    def profile(self):
+        return 'get', reverse(
+            'posts:profile', args=[self.rng.choice(self.authors)]
+        )
+
+    def post_detail(self):
+        return 'get', reverse(
+            'posts:post_detail', args=[self.rng.choice(self.post_ids)]
+        )
+
+    def follow_index(self):
+        return 'get', reverse('posts:follow_index')
+
+    def post_create(self):
+        return 'post', reverse('posts:post_create'), {
+            'text': 'Пост для замера', 'group': '',
+        }
+
+    def post_edit(self):
+        own = list(self.user.posts.filter(
+            pk__gt=self.last_post
+        ).values_list('pk', flat=True)[:100])
+        if not own:
+            # Редактировать можно только свой пост.
+            self.send(*self.post_create())
+            return self.post_edit()
+        return 'post', reverse(
+            'posts:post_edit', args=[self.rng.choice(own)]
+        ), {'text': 'Исправленный пост для замера', 'group': ''}
+
+    def add_comment(self):
+        return 'post', reverse(
+            'posts:add_comment', args=[self.rng.choice(self.post_ids)]
+        ), {'text': 'Комментарий для замера'}
+
+    def profile_follow(self):
+        username = self.rng.choice(self.strangers)
+        self.followed.append(username)
+        return 'get', reverse('posts:profile_follow', args=[username])
+
+    def profile_unfollow(self):
+        if not self.followed:
+            self.send(*self.profile_follow())
+        return 'get', reverse(
+            'posts:profile_unfollow', args=[self.followed.pop()]
+        )
@@ -0,0 +1,82 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts.utils.media import (
+    orphaned_files,
+    orphaned_thumbnail_sources,
+    remove_orphan,
+    remove_thumbnails
+)
+from posts.utils.uploads import image_storage
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки постов, на которые никто не ссылается, '
+        'и миниатюры уже удалённых картинок.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько имён из базы читать за один запрос.',
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=50,
+            help='Не больше стольких удалений в секунду; 0 - без предела.',
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=60 * 60,
+            help=(
+                'Не трогать файлы моложе стольких секунд: пост с ними '
+                'может быть ещё не сохранён.'
+            ),
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только перечислить, что было бы удалено.',
+        )
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.interval = 1 / options['rate'] if options['rate'] else 0
+        self.next_at = 0
+        batch_size = options['batch_size']
+        cutoff = timezone.now() - timedelta(seconds=options['min_age'])
+        files = size = 0
+        for name in orphaned_files(image_storage, batch_size):
+            if image_storage.get_modified_time(name) > cutoff:
+                continue
+            files += 1
+            size += image_storage.size(name)
+            self._remove(name, remove_orphan, name)
+        sources = 0
+        for image in orphaned_thumbnail_sources(image_storage, batch_size):
+            sources += 1
+            self._remove(image.name, remove_thumbnails, image)
+        verb = 'Будет удалено' if self.dry_run else 'Удалено'
+        self.stdout.write(
+            f'{verb} файлов: {files} ({size} байт), '
+            f'наборов миниатюр удалённых картинок: {sources}'
+        )
+
+    def _remove(self, name, remove, target):
+        if self.dry_run:
+            self.stdout.write(name)
+            return
+        # Равномерный темп, чтобы не забивать диск и базу.
+        delay = self.next_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self.next_at = time.monotonic() + self.interval
+        remove(target)
@@ -0,0 +1,259 @@
+import io
+import random
+from datetime import timedelta
+from itertools import accumulate
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Max
+from django.utils import timezone
+from mixer.backend.django import Mixer
+from PIL import Image, ImageDraw
+
+from posts.models import Comment, Follow, Group, MediaFile, Post, User
+from posts.utils.images import placeholder_bytes
+from posts.utils.uploads import image_storage, sharded_name
+
+
+IMAGE_SIZE = (1280, 720)
+
+
+def _popularity(count):
+    """Накопленные веса Ципфа: немногие авторы пишут и читаются чаще."""
+    return list(accumulate(1 / (rank + 1) for rank in range(count)))
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет базу правдоподобными пользователями, группами, '
+        'постами, комментариями, подписками и картинками для замеров. '
+        'Пишет пачками в обход сигналов, затем пересчитывает счётчики, '
+        'ленты и ссылки на файлы и очищает кэш.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10_000)
+        parser.add_argument('--comments', type=int, default=20_000)
+        parser.add_argument(
+            '--follows',
+            type=int,
+            default=20,
+            help='Сколько авторов выбирает каждый новый пользователь.',
+        )
+        parser.add_argument(
+            '--images',
+            type=int,
+            default=50,
+            help='Сколько разных файлов картинок создать.',
+        )
+        parser.add_argument(
+            '--image-share',
+            type=float,
+            default=0.3,
+            help='Доля новых постов с картинкой.',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=365,
+            help='За сколько последних дней распределить даты постов.',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--locale', default='ru_RU')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        # mixer заполняет обязательные поля пользователей и групп;
+        # посты и комментарии собираются напрямую: на миллионах строк
+        # разбор модели в mixer.blend стоит больше самой вставки.
+        self.mixer = Mixer(commit=False, locale=options['locale'])
+        self.faker = self.mixer.faker
+        self.faker.seed_instance(options['seed'])
+        self.batch_size = options['batch_size']
+        users = self.create_users(options['users'])
+        groups = self.create_groups(options['groups'])
+        images = self.create_images(options['images'])
+        authors = list(User.objects.values_list('pk', flat=True))
+        self.rng.shuffle(authors)
+        self.create_posts(
+            options['posts'], authors, groups, images,
+            options['image_share'], options['days'],
+        )
+        self.create_comments(options['comments'], authors)
+        self.create_follows(users, authors, options['follows'])
+        self.count_references(images)
+        call_command(
+            'recount', batch_size=self.batch_size, stdout=self.stdout
+        )
+        call_command('rebalance_timeline', stdout=self.stdout)
+        call_command('backfill_timeline', stdout=self.stdout)
+        # Страницы и фрагменты в кэше не знают о новых строках.
+        cache.clear()
+        self.stdout.write(
+            f'Пользователей: {User.objects.count()}, '
+            f'групп: {Group.objects.count()}, '
+            f'постов: {Post.objects.count()}, '
+            f'комментариев: {Comment.objects.count()}, '
+            f'подписок: {Follow.objects.count()}'
+        )
+
+    def batches(self, total):
+        while total > 0:
+            size = min(self.batch_size, total)
+            yield size
+            total -= size
+
+    def create_users(self, total):
+        offset = User.objects.count()
+        for size in self.batches(total):
+            User.objects.bulk_create([
+                self.mixer.blend(
+                    User,
+                    username=f'{self.faker.user_name()}_{offset + index}',
+                    first_name=self.faker.first_name(),
+                    last_name=self.faker.last_name(),
+                    email=self.faker.email(),
+                    password='!',
+                    is_staff=False,
+                    is_superuser=False,
+                    is_active=True,
+                    last_login=None,
+                )
+                for index in range(size)
+            ])
+            offset += size
+        return list(
+            User.objects.order_by('-pk').values_list('pk', flat=True)[:total]
+        )
+
+    def create_groups(self, total):
+        offset = Group.objects.count()
+        Group.objects.bulk_create([
+            self.mixer.blend(
+                Group,
+                title=self.faker.sentence(nb_words=3)[:200],
+                slug=f'group-{offset + index}',
+                description=self.faker.paragraph(),
+            )
+            for index in range(total)
+        ])
+        return list(Group.objects.values_list('pk', flat=True))
+
+    def create_images(self, total):
+        """Сохраняет total картинок, возвращает пары (имя, заглушка)."""
+        images = []
+        for index in range(total):
+            image = Image.new('RGB', IMAGE_SIZE, tuple(
+                self.rng.randrange(256) for _ in range(3)
+            ))
+            draw = ImageDraw.Draw(image)
+            for _ in range(20):
+                x, y = (self.rng.randrange(side) for side in IMAGE_SIZE)
+                draw.ellipse(
+                    (x, y, x + self.rng.randrange(50, 400),
+                     y + self.rng.randrange(50, 400)),
+                    fill=tuple(self.rng.randrange(256) for _ in range(3)),
+                )
+            buffer = io.BytesIO()
+            image.save(buffer, 'JPEG', quality=settings.IMAGE_QUALITY)
+            data = buffer.getvalue()
+            content = ContentFile(data)
+            name = image_storage.save(sharded_name(
+                settings.MEDIA_SHARDING, f'generated-{index}.jpg', content,
+                timezone.now(),
+            ), content)
+            images.append((name, placeholder_bytes(data)))
+        return images
+
+    def create_posts(self, total, authors, groups, images, image_share,
+                     days):
+        weights = _popularity(len(authors))
+        last = Post.objects.aggregate(last=Max('pk'))['last'] or 0
+        for size in self.batches(total):
+            posts = []
+            for author in self.rng.choices(
+                authors, cum_weights=weights, k=size
+            ):
+                image, placeholder = '', ''
+                if images and self.rng.random() < image_share:
+                    image, placeholder = self.rng.choice(images)
+                posts.append(Post(
+                    author_id=author,
+                    group_id=(
+                        self.rng.choice(groups)
+                        if groups and self.rng.random() < 0.5 else None
+                    ),
+                    text=self.faker.paragraph(
+                        nb_sentences=self.rng.randint(1, 12)
+                    ),
+                    image=image,
+                    image_placeholder=placeholder,
+                ))
+            Post.objects.bulk_create(posts)
+        self.spread_dates(last, total, days)
+
+    def spread_dates(self, last, total, days):
+        """Раскладывает даты новых постов по последним days дням.
+
+        auto_now_add ставит всей пачке одно время создания, и ленты
+        с одинаковыми датами упорядочивались бы только по id.
+        bulk_update не вызывает pre_save, поэтому даты сохраняются.
+        Даты растут вместе с id, как у постов, написанных по очереди.
+        """
+        end = timezone.now()
+        span = timedelta(days=days)
+        moments = iter(sorted(self.rng.random() for _ in range(total)))
+        ids = list(Post.objects.filter(pk__gt=last).order_by(
+            'pk'
+        ).values_list('pk', flat=True))
+        for start in range(0, len(ids), self.batch_size):
+            Post.objects.bulk_update([
+                Post(pk=pk, pub_date=end - span * (1 - next(moments)))
+                for pk in ids[start:start + self.batch_size]
+            ], ['pub_date'])
+
+    def create_comments(self, total, authors):
+        posts = list(Post.objects.values_list('pk', flat=True))
+        if not posts:
+            return
+        # Обсуждают в основном свежие посты.
+        weights = _popularity(len(posts))
+        posts.reverse()
+        for size in self.batches(total):
+            Comment.objects.bulk_create([
+                Comment(
+                    post_id=post,
+                    author_id=self.rng.choice(authors),
+                    text=self.faker.sentence(),
+                )
+                for post in self.rng.choices(
+                    posts, cum_weights=weights, k=size
+                )
+            ])
+
+    def create_follows(self, users, authors, per_user):
+        weights = _popularity(len(authors))
+        follows = []
+        for user in users:
+            chosen = set(self.rng.choices(
+                authors, cum_weights=weights, k=per_user
+            )) - {user}
+            follows.extend(
+                Follow(user_id=user, author_id=author) for author in chosen
+            )
+        Follow.objects.bulk_create(follows, ignore_conflicts=True)
+
+    def count_references(self, images):
+        totals = Post.objects.filter(
+            image__in=[name for name, _ in images]
+        ).order_by().values_list('image').annotate(Count('pk'))
+        for name, total in totals:
+            MediaFile.objects.update_or_create(
+                name=name, defaults={'references': total}
+            )
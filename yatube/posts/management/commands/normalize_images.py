@@ -0,0 +1,85 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.models import Post
+from posts.utils.images import normalize_bytes
+from posts.utils.thumbnails import generate_thumbnails
+from posts.utils.uploads import sharded_name
+
+
+def _normalize(data, max_side, image_format, quality):
+    try:
+        return normalize_bytes(data, max_side, image_format, quality)
+    except (OSError, ValueError):
+        # Битый файл оставляем как есть.
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Уменьшает и перекодирует уже загруженные картинки постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Сколько процессов перекодируют картинки.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Сколько картинок читать в память за раз.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        posts = Post.objects.exclude(image='').order_by('pk')
+        changed = checked = last_pk = 0
+        # Настройки передаются явно: процессы пула могут не знать Django.
+        normalize = partial(
+            _normalize,
+            max_side=settings.IMAGE_MAX_SIDE,
+            image_format=settings.IMAGE_FORMAT,
+            quality=settings.IMAGE_QUALITY,
+        )
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                batch = list(posts.filter(pk__gt=last_pk)[:batch_size])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+                batch = [post for post in batch if post.image.storage.exists(
+                    post.image.name
+                )]
+                data = []
+                for post in batch:
+                    with post.image.open('rb') as image:
+                        data.append(image.read())
+                for post, normalized in zip(batch, pool.map(normalize, data)):
+                    checked += 1
+                    if normalized is not None:
+                        self._replace(post, *normalized)
+                        changed += 1
+        self.stdout.write(
+            f'Проверено картинок: {checked}, перекодировано: {changed}'
+        )
+
+    def _replace(self, post, data, extension):
+        old_name = post.image.name
+        name = os.path.splitext(os.path.basename(old_name))[0] + extension
+        content = ContentFile(data)
+        # В одной транзакции: уже лежащий файл держит media.pin.
+        with transaction.atomic():
+            post.image.name = post.image.storage.save(sharded_name(
+                settings.MEDIA_SHARDING, name, content, post.pub_date
+            ), content)
+            # Старый файл удалит счётчик ссылок, если он больше не нужен.
+            post.save(update_fields=['image'])
+        generate_thumbnails(post.image)
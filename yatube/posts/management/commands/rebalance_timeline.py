@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import AuthorStats
+from posts.utils.constants import TIMELINE_BATCH_SIZE
+from posts.utils.timeline import drop_author, fan_out_author, sync_author_modes
+
+
+class Command(BaseCommand):
+    help = (
+        'Переводит авторов между раскладкой по лентам и подмешиванием '
+        'при чтении: сверяет режимы с порогами, убирает из лент посты '
+        'подмешиваемых авторов и раскладывает старые посты вернувшихся. '
+        'Запускается по расписанию.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=TIMELINE_BATCH_SIZE,
+            help='Сколько записей ленты вставлять или удалять за раз.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        pulled, pushing = sync_author_modes()
+        removed = sum(
+            drop_author(author_id, batch_size)
+            for author_id in self.authors(AuthorStats.PULL)
+        )
+        pushed = sum(
+            fan_out_author(author_id, batch_size)
+            for author_id in self.authors(AuthorStats.PUSHING)
+        )
+        self.stdout.write(
+            f'Переключено авторов: на подмешивание {pulled}, '
+            f'в ленты {pushing}; убрано записей {removed}; '
+            f'разложено авторов {pushed}'
+        )
+
+    @staticmethod
+    def authors(mode):
+        return list(AuthorStats.objects.filter(
+            timeline_mode=mode
+        ).values_list('user_id', flat=True))
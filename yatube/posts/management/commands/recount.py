@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post, User
+from posts.utils.counters import recount_posts, recount_users
+
+
+def _batches(queryset, batch_size):
+    """Выдаёт первичные ключи пачками по возрастанию без OFFSET."""
+    last_pk = 0
+    while True:
+        batch = list(
+            queryset.filter(pk__gt=last_pk).order_by('pk').values_list(
+                'pk', flat=True
+            )[:batch_size]
+        )
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1]
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов, комментариев и подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        users = sum(
+            recount_users(batch)
+            for batch in _batches(User.objects.all(), batch_size)
+        )
+        posts = sum(
+            recount_posts(batch)
+            for batch in _batches(Post.objects.all(), batch_size)
+        )
+        self.stdout.write(
+            f'Исправлено счётчиков: пользователей {users}, постов {posts}'
+        )
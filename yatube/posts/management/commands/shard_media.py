@@ -0,0 +1,79 @@
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.models import Post
+from posts.utils import media
+from posts.utils.thumbnails import generate_thumbnails
+from posts.utils.uploads import sharded_name
+from posts.utils.versions import bump_version
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов под имена по содержимому в '
+        'подкаталоги по MEDIA_SHARDING и переписывает пути пачками.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Сколько постов переносить за раз.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать файлы, которые нужно перенести.',
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').exclude(image=None)
+        posts = posts.order_by('pk')
+        moved = last_pk = 0
+        while True:
+            batch = list(
+                posts.filter(pk__gt=last_pk)[:options['batch_size']]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            for post in batch:
+                if self._move(post, options['dry_run']):
+                    moved += 1
+        verb = 'Нужно перенести' if options['dry_run'] else 'Перенесено'
+        self.stdout.write(f'{verb} файлов: {moved}')
+
+    def _move(self, post, dry_run):
+        old_name = post.image.name
+        storage = post.image.storage
+        if not storage.exists(old_name):
+            return False
+        with post.image.open('rb') as image:
+            content = ContentFile(image.read())
+        target = sharded_name(
+            settings.MEDIA_SHARDING, old_name, content, post.pub_date
+        )
+        if target == old_name:
+            return False
+        if dry_run:
+            return True
+        # Сначала копия, потом путь в базе: старый файл отдаётся,
+        # пока строка не переписана. Уже лежащую копию до конца
+        # транзакции держит media.pin.
+        with transaction.atomic():
+            new_name = storage.save(target, content)
+            media.retain(new_name)
+            if not Post.objects.filter(pk=post.pk, image=old_name).update(
+                image=new_name
+            ):
+                # Картинку поста успели поменять, копия не нужна.
+                media.release(new_name)
+                return False
+            media.release(old_name)
+        bump_version('post', post.pk)
+        post.image.name = new_name
+        generate_thumbnails(post.image)
+        return True
@@ -0,0 +1,42 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:01
+
+from django.db import migrations, models
+import posts.utils.uploads
+
+
+def fill_references(apps, schema_editor):
+    MediaFile = apps.get_model('posts', 'MediaFile')
+    Post = apps.get_model('posts', 'Post')
+    totals = Post.objects.exclude(image='').exclude(image=None).order_by(
+    ).values_list('image').annotate(models.Count('pk'))
+    MediaFile.objects.bulk_create(
+        [MediaFile(name=name, references=total) for name, total in totals],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_post_image_upload_to'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='Путь к файлу')),
+                ('references', models.IntegerField(default=0, verbose_name='Число ссылок')),
+            ],
+            options={
+                'verbose_name': 'Файл картинки',
+                'verbose_name_plural': 'Файлы картинок',
+            },
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=posts.utils.uploads.ImageStorage(), upload_to=posts.utils.uploads.post_image_path, verbose_name='Картинка'),
+        ),
+        migrations.RunPython(fill_references, migrations.RunPython.noop),
+    ]
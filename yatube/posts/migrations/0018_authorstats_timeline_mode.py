@@ -0,0 +1,31 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_pulled(apps, schema_editor):
+    # До этого режим определялся порогом при каждом чтении.
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    if limit is None:
+        return
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    AuthorStats.objects.filter(followers_count__gte=limit).update(
+        timeline_mode='pull'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='authorstats',
+            name='timeline_mode',
+            field=models.CharField(choices=[('push', 'Раскладывается по лентам'), ('pull', 'Подмешивается при чтении'), ('pushing', 'Ждёт раскладки старых постов')], default='push', max_length=7, verbose_name='Режим ленты'),
+        ),
+        migrations.RunPython(mark_pulled, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,7 @@ from django.db import models
 from django.contrib.auth import get_user_model
 
 from .utils.constants import FIRST_CHARACTERS_OF_POST
+from .utils.uploads import image_storage, post_image_path
 
 
 User = get_user_model()
@@ -53,11 +54,23 @@ class Post(models.Model):
         help_text='Группа, к которой будет относиться пост',
     )
     image = models.ImageField(
-        upload_to='posts/',
+        upload_to=post_image_path,
+        storage=image_storage,
         blank=True,
         null=True,
         verbose_name='Картинка',
     )
+    image_placeholder = models.TextField(
+        blank=True,
+        editable=False,
+        verbose_name='Заглушка картинки',
+        help_text='Крошечный JPEG в data URI, пока грузится картинка',
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число комментариев',
+    )
 
     def __str__(self):
         return self.text[:FIRST_CHARACTERS_OF_POST]
@@ -66,6 +79,22 @@ class Post(models.Model):
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # По индексу на каждую ленту: строки страницы идут прямо
+        # из индекса в порядке POST_ORDERING, без сортировки.
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx'
+            ),
+        ]
 
 
 class Comment(models.Model):
@@ -99,6 +128,12 @@ class Comment(models.Model):
         ordering = ('-created',)
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_created_idx'
+            ),
+        ]
 
 
 class Follow(models.Model):
@@ -127,3 +162,115 @@ class Follow(models.Model):
                 name='unique_name'
             )
         ]
+
+
+class TimelineEntry(models.Model):
+    """Пост в ленте подписок читателя, записанный при публикации."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор поста',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации',
+    )
+
+    def __str__(self):
+        return f'{self.user} - {self.post_id}'
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx'
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='timeline_user_author_idx'
+            ),
+        ]
+
+
+class AuthorStats(models.Model):
+    """Счётчики пользователя, которые поддерживаются при записи."""
+    PUSH = 'push'
+    PULL = 'pull'
+    PUSHING = 'pushing'
+    TIMELINE_MODES = (
+        (PUSH, 'Раскладывается по лентам'),
+        (PULL, 'Подмешивается при чтении'),
+        (PUSHING, 'Ждёт раскладки старых постов'),
+    )
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Число постов',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Число подписчиков',
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Число подписок',
+    )
+    timeline_mode = models.CharField(
+        max_length=7,
+        choices=TIMELINE_MODES,
+        default=PUSH,
+        verbose_name='Режим ленты',
+    )
+
+    def __str__(self):
+        return str(self.user)
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+
+class MediaFile(models.Model):
+    """Файл картинки и число постов, которые на него ссылаются."""
+    name = models.CharField(
+        max_length=100,
+        primary_key=True,
+        verbose_name='Путь к файлу',
+    )
+    references = models.IntegerField(
+        default=0,
+        verbose_name='Число ссылок',
+    )
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
@@ -0,0 +1,187 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Comment, Follow, Group, Post, User
+from .utils import counters, media, timeline
+from .utils.page_cache import invalidate_page
+from .utils.versions import bump_version
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        counters.bump_author(instance.author_id, 'posts_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.bump_author(instance.author_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, raw, **kwargs):
+    if created and not raw and instance.post_id is not None:
+        counters.bump_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    if instance.post_id is not None:
+        counters.bump_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        counters.bump_author(instance.author_id, 'followers_count', 1)
+        counters.bump_author(instance.user_id, 'following_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.bump_author(instance.author_id, 'followers_count', -1)
+    counters.bump_author(instance.user_id, 'following_count', -1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, raw, **kwargs):
+    # При loaddata ленты собираются командой backfill_timeline.
+    if created and not raw:
+        timeline.fan_out_post(instance)
+
+
+@receiver(post_save, sender=Follow)
+def switch_mode_on_follow(sender, instance, created, raw, **kwargs):
+    # Раньше fill_timeline_on_follow: автору, ставшему подмешиваемым,
+    # копировать посты в ленту нового подписчика уже не нужно.
+    if created and not raw:
+        timeline.switch_author_mode(instance.author_id, 1)
+
+
+@receiver(post_delete, sender=Follow)
+def switch_mode_on_unfollow(sender, instance, **kwargs):
+    timeline.switch_author_mode(instance.author_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def fill_timeline_on_follow(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        timeline.add_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def clean_timeline_on_unfollow(sender, instance, **kwargs):
+    timeline.remove_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def bump_post_version(sender, instance, **kwargs):
+    bump_version('post', instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_commented_post_version(sender, instance, **kwargs):
+    if instance.post_id is not None:
+        bump_version('post', instance.post_id)
+
+
+@receiver(post_save, sender=User)
+def bump_user_version(sender, instance, update_fields, **kwargs):
+    # Вход пользователя обновляет только last_login - карточки не меняются.
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    bump_version('user', instance.pk)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def bump_group_version(sender, instance, **kwargs):
+    bump_version('group', instance.pk)
+
+
+@receiver(pre_save, sender=Post)
+def remember_old_group(sender, instance, raw, **kwargs):
+    # Пост могли перенести в другую группу: её страницу тоже сбросим.
+    # Старая картинка нужна счётчику ссылок на файлы.
+    instance._old_group_id = None
+    instance._old_image = None
+    if not instance._state.adding and not raw:
+        instance._old_group_id, instance._old_image = Post.objects.filter(
+            pk=instance.pk
+        ).values_list('group_id', 'image').first() or (None, None)
+
+
+@receiver(post_save, sender=Post)
+def count_image_references(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    old_image = getattr(instance, '_old_image', None) or ''
+    new_image = instance.image.name or ''
+    if created or old_image != new_image:
+        media.retain(new_image)
+        media.release(old_image)
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    media.release(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_pages(sender, instance, **kwargs):
+    invalidate_page('index_page')
+    invalidate_page('profile_page', instance.author.username)
+    group_ids = {
+        instance.group_id, getattr(instance, '_old_group_id', None)
+    } - {None}
+    slugs = Group.objects.filter(pk__in=group_ids).values_list(
+        'slug', flat=True
+    )
+    for slug in slugs:
+        invalidate_page('group_page', slug)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_pages(sender, instance, **kwargs):
+    invalidate_page('index_page')
+    invalidate_page('group_page', instance.slug)
+
+
+@receiver(pre_save, sender=User)
+def remember_old_username(sender, instance, raw, update_fields, **kwargs):
+    # После переименования профиль под старым именем должен пропасть.
+    instance._old_username = None
+    if instance._state.adding or raw:
+        return
+    if update_fields is not None and 'username' not in update_fields:
+        return
+    instance._old_username = User.objects.filter(
+        pk=instance.pk
+    ).values_list('username', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_pages(sender, instance, created, update_fields,
+                          **kwargs):
+    if created or update_fields and set(update_fields) <= {'last_login'}:
+        return
+    invalidate_page('index_page')
+    invalidate_page('profile_page', instance.username)
+    old_username = getattr(instance, '_old_username', None)
+    if old_username and old_username != instance.username:
+        invalidate_page('profile_page', old_username)
+    slugs = Group.objects.filter(
+        posts__author=instance
+    ).distinct().values_list('slug', flat=True)
+    for slug in slugs:
+        invalidate_page('group_page', slug)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_followed_profile(sender, instance, **kwargs):
+    invalidate_page('profile_page', instance.author.username)
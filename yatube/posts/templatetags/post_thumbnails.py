@@ -0,0 +1,31 @@
+from django import template
+
+from ..utils.constants import CARD_SIZES
+from ..utils.thumbnails import PageThumbnails
+
+
+register = template.Library()
+
+
+@register.inclusion_tag('includes/card_image.html', takes_context=True)
+def card_image(context, post, eager=False):
+    """Картинка поста со srcset из общего для страницы thumbnails.
+
+    eager=True - для картинок в первом экране, остальные грузятся
+    лениво. До загрузки на месте картинки видна её заглушка.
+    """
+    thumbnails = context.get('thumbnails')
+    if thumbnails is None:
+        thumbnails = PageThumbnails([post])
+    images = thumbnails.get(post)
+    if not images:
+        return {'image': None}
+    return {
+        'image': images[-1],
+        'srcset': ', '.join(
+            '{} {}w'.format(image.url, image.width) for image in images
+        ),
+        'sizes': CARD_SIZES,
+        'lazy': not eager,
+        'placeholder': post.image_placeholder,
+    }
@@ -0,0 +1,93 @@
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import Max, Min, Sum
+from django.test import override_settings, TestCase
+from django.utils import timezone
+
+from ..management.commands.benchmark_views import READS, WRITES
+from ..models import AuthorStats, Comment, Follow, MediaFile, Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class BenchmarkTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command(
+            'generate_data', users=8, groups=2, posts=40, comments=30,
+            follows=3, images=2, image_share=0.5, batch_size=16,
+            stdout=StringIO(),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_generated_data_consistent(self):
+        """Сгенерированные данные согласованы со счётчиками"""
+        self.assertEqual(User.objects.count(), 8)
+        self.assertEqual(Post.objects.count(), 40)
+        self.assertEqual(Comment.objects.count(), 30)
+        self.assertTrue(Follow.objects.exists())
+        self.assertFalse(User.objects.filter(is_staff=True).exists())
+        self.assertEqual(
+            AuthorStats.objects.aggregate(total=Sum('posts_count'))['total'],
+            40
+        )
+        self.assertEqual(
+            MediaFile.objects.aggregate(total=Sum('references'))['total'],
+            Post.objects.exclude(image='').count()
+        )
+
+    def test_generated_dates_spread(self):
+        """Даты постов разложены по году и растут вместе с id"""
+        dates = list(Post.objects.order_by('pk').values_list(
+            'pub_date', flat=True
+        ))
+        self.assertEqual(len(set(dates)), len(dates))
+        self.assertEqual(dates, sorted(dates))
+        span = Post.objects.aggregate(first=Min('pub_date'), last=Max(
+            'pub_date'
+        ))
+        self.assertGreater(span['last'] - span['first'], timedelta(days=30))
+        self.assertLessEqual(span['last'], timezone.now())
+
+    def test_benchmark_reports_every_view(self):
+        """Бенчмарк отчитывается по всем вьюхам и убирает за собой"""
+        counts = (
+            Post.objects.count(), Comment.objects.count(),
+            Follow.objects.count(),
+        )
+        out = StringIO()
+        call_command(
+            'benchmark_views', requests=3, warmup=1, stdout=out,
+            stderr=StringIO(),
+        )
+        report = json.loads(out.getvalue())
+        for name in READS + WRITES:
+            with self.subTest(view=name):
+                self.assertEqual(report[name]['errors'], 0)
+                self.assertLessEqual(
+                    report[name]['p50_ms'], report[name]['p99_ms']
+                )
+                if name in WRITES:
+                    self.assertGreater(
+                        report[name]['queries_per_request'], 0
+                    )
+        self.assertEqual(counts, (
+            Post.objects.count(), Comment.objects.count(),
+            Follow.objects.count(),
+        ))
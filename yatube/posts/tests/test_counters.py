@@ -0,0 +1,153 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..admin import PostAdmin
+from ..forms import PostForm
+from ..models import AuthorStats, Comment, Follow, Post, User
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='post_author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def stats(self, user):
+        return AuthorStats.objects.get(user=user)
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются вместе с постами, комментариями и подписками"""
+        self.author_client.post(
+            reverse('posts:post_create'), data={'text': 'Пост'}
+        )
+        post = Post.objects.get()
+        self.reader_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+            data={'text': 'Комментарий'},
+        )
+        self.reader_client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'post_author'})
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+
+        self.reader_client.get(
+            reverse(
+                'posts:profile_unfollow', kwargs={'username': 'post_author'}
+            )
+        )
+        Comment.objects.all().delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+
+    def test_post_edit_keeps_comments_count(self):
+        """Правка устаревшего экземпляра не затирает число комментариев"""
+        post = Post.objects.create(text='Пост', author=self.author)
+        Comment.objects.create(post=post, author=self.reader, text='1')
+        form = PostForm(data={'text': 'Новый текст'}, instance=post)
+        self.assertTrue(form.is_valid())
+        form.save()
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'Новый текст')
+        self.assertEqual(post.comments_count, 1)
+
+    def test_admin_edit_keeps_comments_count(self):
+        """Правка в админке не затирает число комментариев"""
+        post = Post.objects.create(text='Пост', author=self.author)
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        self.client.force_login(admin)
+        Comment.objects.create(post=post, author=self.reader, text='1')
+        # Админка прочитала пост до нового комментария.
+        with mock.patch.object(PostAdmin, 'get_object', return_value=post):
+            self.client.post(
+                reverse('admin:posts_post_change', args=[post.pk]), {
+                    'text': 'Новый текст', 'author': self.author.pk,
+                    'group': '',
+                }
+            )
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'Новый текст')
+        self.assertEqual(post.comments_count, 1)
+
+    def test_plain_save_writes_comments_count(self):
+        """Обычный save сохраняет и заданное руками число комментариев"""
+        post = Post.objects.create(text='Пост', author=self.author)
+        post.comments_count = 5
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 5)
+
+    def test_recount_fixes_drift(self):
+        """Команда recount исправляет разошедшиеся счётчики"""
+        post = Post.objects.create(text='Пост', author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        AuthorStats.objects.update(
+            posts_count=7, followers_count=7, following_count=7
+        )
+        Post.objects.update(comments_count=7)
+        AuthorStats.objects.filter(user=self.reader).delete()
+        call_command('recount', batch_size=1, stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(
+            [
+                self.stats(self.author).posts_count,
+                self.stats(self.author).followers_count,
+                self.stats(self.reader).following_count,
+            ],
+            [1, 1, 1]
+        )
+
+    def test_profile_shows_counter(self):
+        """Профиль берёт число постов из счётчика"""
+        Post.objects.create(text='Пост', author=self.author)
+        response = self.reader_client.get(
+            reverse('posts:profile', kwargs={'username': 'post_author'})
+        )
+        self.assertContains(response, 'Всего постов: 1')
+
+    def test_delete_user_with_posts_and_follows(self):
+        """Удаление пользователя с постами и подписками не ломает счётчики"""
+        for text in ('Первый', 'Второй', 'Третий'):
+            Post.objects.create(text=text, author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.author, author=self.reader)
+        # Свежий экземпляр: delete обнуляет pk общего self.author.
+        User.objects.get(pk=self.author.pk).delete()
+        self.assertFalse(
+            AuthorStats.objects.filter(user=self.author.pk).exists()
+        )
+        stats = self.stats(self.reader)
+        self.assertEqual(
+            (stats.followers_count, stats.following_count), (0, 0)
+        )
+
+    def test_save_reinserts_deleted_post(self):
+        """Сохранение поста, строку которого удалили, вставляет её заново"""
+        post = Post.objects.create(text='Пост', author=self.author)
+        Post.objects.filter(pk=post.pk).delete()
+        post.text = 'Снова'
+        post.save()
+        self.assertEqual(Post.objects.get(pk=post.pk).text, 'Снова')
@@ -4,11 +4,13 @@ from http import HTTPStatus
 
 from django.conf import settings
 from django.core.cache import cache
+from django.core.files.base import ContentFile
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, override_settings, TestCase
 from django.urls import reverse
 
 from posts.models import Group, Post, User
+from posts.utils.uploads import sharded_name
 
 TEST_DIR = 'test_data'
 
@@ -75,7 +77,10 @@ class PostCreateFormTests(TestCase):
                 text='Текст поста',
                 author=self.user,
                 group=self.group,
-                image='posts/small.gif',
+                image=sharded_name(
+                    settings.MEDIA_SHARDING, 'small.gif',
+                    ContentFile(small_gif)
+                ),
             ).exists()
         )
         self.assertEqual(
@@ -163,7 +168,10 @@ class PostEditFormTests(TestCase):
                 text='Новый текст',
                 author=self.user,
                 group=self.group_2,
-                image='posts/small.gif',
+                image=sharded_name(
+                    settings.MEDIA_SHARDING, 'small.gif',
+                    ContentFile(small_gif)
+                ),
             ).exists()
         )
         self.assertEqual(
@@ -0,0 +1,229 @@
+import io
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import override_settings, TestCase
+from django.urls import reverse
+from PIL import Image
+
+from ..forms import PostForm
+from ..models import MediaFile, Post, User
+from ..utils import media, thumbnails
+from ..utils.uploads import image_storage, sharded_name
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+
+
+def photo(size=(300, 200)):
+    """PNG с EXIF, как снимок с телефона."""
+    image = Image.new('RGB', size, 'red')
+    exif = Image.Exif()
+    exif[0x010F] = 'Phone'
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG', exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    THUMBNAIL_WORKERS=0,
+    IMAGE_MAX_SIDE=100,
+    IMAGE_FORMAT='JPEG',
+    MEDIA_SHARDING='hash',
+)
+class ImageNormalizationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='post_author')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        # TestCase не фиксирует транзакции: файлы удаляем сразу.
+        patcher = mock.patch.object(
+            media.transaction, 'on_commit', side_effect=lambda f: f()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def save_form(self, name, content):
+        form = PostForm(
+            data={'text': 'Текст'},
+            files={'image': SimpleUploadedFile(name, content)},
+        )
+        form.instance.author = self.user
+        self.assertTrue(form.is_valid(), form.errors)
+        return form.save()
+
+    def test_upload_downscaled_and_stripped(self):
+        """Большая картинка уменьшается, теряет EXIF и становится JPEG"""
+        post = self.save_form('photo.png', photo())
+        self.assertRegex(post.image.name, r'^posts/\w\w/\w\w/\w{40}\.jpg$')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (100, 67))
+            self.assertNotIn('exif', image.info)
+
+    def test_small_image_kept(self):
+        """Маленькую картинку без метаданных не перекодируем"""
+        post = self.save_form('small.gif', SMALL_GIF)
+        with post.image.open('rb') as image:
+            self.assertEqual(image.read(), SMALL_GIF)
+
+    def test_truncated_upload_rejected(self):
+        """Обрезанный JPEG - ошибка формы, а не падение вьюхи"""
+        buffer = io.BytesIO()
+        Image.effect_noise((300, 200), 64).save(buffer, 'JPEG')
+        # Заголовок цел, поэтому проверку ImageField файл проходит.
+        data = buffer.getvalue()[:len(buffer.getvalue()) // 2]
+        form = PostForm(
+            data={'text': 'Текст'},
+            files={'image': SimpleUploadedFile('broken.jpg', data)},
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
+        self.assertFalse(Post.objects.exists())
+
+    def test_command_reprocesses_existing_media(self):
+        """Команда перекодирует уже загруженные картинки"""
+        post = Post.objects.create(
+            text='Текст', author=self.user,
+            image=SimpleUploadedFile('old.png', photo((400, 400))),
+        )
+        old_name = post.image.name
+        out = StringIO()
+        call_command('normalize_images', workers=1, stdout=out)
+        post.refresh_from_db()
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (100, 100))
+        self.assertFalse(post.image.storage.exists(old_name))
+        self.assertIn('перекодировано: 1', out.getvalue())
+
+    def test_placeholder_saved_and_rendered(self):
+        """Заглушка считается при загрузке и встраивается в карточку"""
+        post = self.save_form('photo.png', photo())
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/jpeg;base64,')
+        )
+        self.assertLess(len(post.image_placeholder), 1000)
+        response = self.client.get(reverse('posts:posts_index'))
+        self.assertContains(response, post.image_placeholder)
+
+    def test_backfill_placeholders(self):
+        """Команда заполняет заглушки старых постов"""
+        post = Post.objects.create(
+            text='Текст', author=self.user,
+            image=SimpleUploadedFile('old.png', photo()),
+        )
+        Post.objects.create(text='Без картинки', author=self.user)
+        out = StringIO()
+        call_command('backfill_placeholders', workers=1, stdout=out)
+        post.refresh_from_db()
+        self.assertTrue(post.image_placeholder.startswith('data:image/'))
+        self.assertIn('Заполнено заглушек: 1', out.getvalue())
+
+    def test_shard_media_moves_flat_files(self):
+        """Команда переносит старые файлы в подкаталоги"""
+        post = Post.objects.create(text='Текст', author=self.user)
+        storage = post.image.storage
+        old_name = default_storage.save(
+            'posts/flat.gif', ContentFile(SMALL_GIF)
+        )
+        # Так файл выглядит после миграции, заполнившей счётчики.
+        Post.objects.filter(pk=post.pk).update(image=old_name)
+        MediaFile.objects.create(name=old_name, references=1)
+        out = StringIO()
+        call_command('shard_media', dry_run=True, stdout=out)
+        self.assertIn('Нужно перенести файлов: 1', out.getvalue())
+        call_command('shard_media', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.image.name, sharded_name(
+            'hash', 'flat.gif', ContentFile(SMALL_GIF)
+        ))
+        self.assertEqual(
+            MediaFile.objects.get(name=post.image.name).references, 1
+        )
+        self.assertTrue(storage.exists(post.image.name))
+        self.assertFalse(storage.exists(old_name))
+        out = StringIO()
+        call_command('shard_media', stdout=out)
+        self.assertIn('Перенесено файлов: 0', out.getvalue())
+
+    def test_identical_uploads_share_one_file(self):
+        """Одинаковые картинки хранятся одним файлом до последней ссылки"""
+        first = self.save_form('one.gif', SMALL_GIF)
+        second = self.save_form('two.gif', SMALL_GIF)
+        self.assertEqual(first.image.name, second.image.name)
+        name = first.image.name
+        self.assertEqual(MediaFile.objects.get(name=name).references, 2)
+        first.delete()
+        self.assertTrue(default_storage.exists(name))
+        second.delete()
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(MediaFile.objects.filter(name=name).exists())
+
+    def test_identical_upload_survives_collect(self):
+        """Файл, отданный новой загрузке, не удаляет сборка старого"""
+        first = self.save_form('one.gif', SMALL_GIF)
+        name = first.image.name
+        # Последний пост с файлом удалён, сборка ещё не прошла.
+        Post.objects.filter(pk=first.pk).update(image='')
+        MediaFile.objects.filter(name=name).update(references=0)
+        exists = image_storage.exists
+        checked = []
+
+        def collect_after_check(path):
+            found = exists(path)
+            if not checked:
+                checked.append(path)
+                media.collect(path)
+            return found
+
+        with mock.patch.object(
+            image_storage, 'exists', side_effect=collect_after_check
+        ):
+            second = self.save_form('two.gif', SMALL_GIF)
+        self.assertEqual(second.image.name, name)
+        self.assertTrue(image_storage.exists(name))
+        self.assertEqual(MediaFile.objects.get(name=name).references, 1)
+
+    def test_collect_media_removes_orphans(self):
+        """Сборщик удаляет только файлы без постов и их миниатюры"""
+        kept = default_storage.save('posts/ab.gif', ContentFile(SMALL_GIF))
+        Post.objects.create(text='Текст', author=self.user, image=kept)
+        orphan = default_storage.save(
+            'posts/ab/orphan.gif', ContentFile(SMALL_GIF)
+        )
+        gone = self.save_form('gone.gif', photo())
+        thumbnail = thumbnails.generate_thumbnails(gone.image)[0].result()
+        default_storage.delete(gone.image.name)
+        out = StringIO()
+        call_command('collect_media', dry_run=True, min_age=0, stdout=out)
+        self.assertIn(orphan, out.getvalue())
+        self.assertNotIn(kept, out.getvalue())
+        self.assertTrue(default_storage.exists(orphan))
+        call_command('collect_media', min_age=0, rate=0, stdout=StringIO())
+        self.assertFalse(default_storage.exists(orphan))
+        self.assertTrue(default_storage.exists(kept))
+        self.assertFalse(default_storage.exists(thumbnail.name))
@@ -0,0 +1,51 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from core.memory import allocation_budget
+
+from ..models import Comment, Group, Post, User
+
+
+# Пик выделений на одну страницу ленты без учёта первой отрисовки.
+PAGE_BUDGET = 512 * 1024
+
+
+class ViewMemoryTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='post_author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='test-slug', description='Описание'
+        )
+        for i in range(30):
+            post = Post.objects.create(
+                text='Текст поста ' * 20, author=cls.user, group=cls.group
+            )
+            Comment.objects.bulk_create(
+                Comment(post=post, author=cls.user, text='Комментарий')
+                for _ in range(20)
+            )
+        cls.post = post
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_pages_within_allocation_budget(self):
+        """Страницы постов укладываются в бюджет памяти"""
+        urls = (
+            reverse('posts:posts_index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.user.username]),
+            reverse('posts:post_detail', args=[self.post.pk]),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                # Первый запрос компилирует шаблоны и греет кэши модулей.
+                self.client.get(url)
+                cache.clear()
+                with allocation_budget(PAGE_BUDGET):
+                    self.client.get(url)
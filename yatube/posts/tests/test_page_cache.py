@@ -0,0 +1,98 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import override_settings, RequestFactory, TestCase
+from django.urls import reverse
+
+from ..utils import page_cache
+
+
+class StaleWhileRevalidateTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        page_cache.cache_registry.clear()
+        self.factory = RequestFactory()
+        self.calls = 0
+
+    def make_view(self, soft_ttl):
+        @page_cache.swr_cache_page(soft_ttl, 60, 'test_page')
+        def view(request):
+            self.calls += 1
+            return HttpResponse(f'render {self.calls}')
+        return view
+
+    def get(self, view, cookie=''):
+        return view(self.factory.get('/test/', HTTP_COOKIE=cookie))
+
+    def test_hit_after_miss(self):
+        """Свежая копия отдаётся без вызова вьюхи"""
+        view = self.make_view(60)
+        first = self.get(view)
+        second = self.get(view)
+        self.assertEqual(first['X-Cache'], 'miss')
+        self.assertEqual(second['X-Cache'], 'hit')
+        self.assertEqual(second.content, b'render 1')
+        self.assertEqual(self.calls, 1)
+
+    def test_browsers_do_not_cache(self):
+        """Браузерам страница отдаётся без срока хранения"""
+        view = self.make_view(60)
+        for outcome in ('miss', 'hit'):
+            with self.subTest(outcome=outcome):
+                response = self.get(view)
+                self.assertEqual(response['X-Cache'], outcome)
+                self.assertEqual(
+                    response['Cache-Control'], 'private, max-age=0'
+                )
+                self.assertFalse(response.has_header('Expires'))
+
+    def test_stale_served_while_other_worker_rebuilds(self):
+        """Пока другой запрос держит блокировку, отдаётся старая копия"""
+        view = self.make_view(0)
+        self.get(view)
+        with mock.patch.object(page_cache.cache, 'add', return_value=False):
+            response = self.get(view)
+        self.assertEqual(response['X-Cache'], 'stale')
+        self.assertEqual(response.content, b'render 1')
+        self.assertEqual(self.calls, 1)
+
+        response = self.get(view)
+        self.assertEqual(response['X-Cache'], 'refresh')
+        self.assertEqual(response.content, b'render 2')
+
+    def test_stale_copy_only_for_its_visitor(self):
+        """Устаревшая копия отдаётся только тому, чья она"""
+        view = self.make_view(0)
+        alice, bob = 'sessionid=alice', 'sessionid=bob'
+        self.assertEqual(self.get(view, alice).content, b'render 1')
+        self.assertEqual(self.get(view, bob).content, b'render 2')
+        with mock.patch.object(page_cache.cache, 'add', return_value=False):
+            for cookie, content in ((alice, b'render 1'), (bob, b'render 2')):
+                with self.subTest(cookie=cookie):
+                    response = self.get(view, cookie)
+                    self.assertEqual(response['X-Cache'], 'stale')
+                    self.assertEqual(response.content, content)
+            response = self.get(view, 'sessionid=carol')
+        self.assertEqual(response['X-Cache'], 'miss')
+        self.assertEqual(response.content, b'render 3')
+
+    def test_new_version_marks_copy_stale(self):
+        """Смена версии страницы перестраивает её, исходы видны в метриках"""
+        view = self.make_view(60)
+        self.get(view)
+        page_cache.invalidate_page('test_page')
+        self.assertEqual(self.get(view).content, b'render 2')
+        with override_settings(METRICS_TOKEN='secret'):
+            text = self.client.get(
+                reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret'
+            ).content.decode()
+        self.assertIn('# TYPE yatube_page_cache_miss_total counter', text)
+        for outcome, count in (
+            ('hit', 0), ('stale', 0), ('refresh', 1), ('miss', 1)
+        ):
+            self.assertIn(
+                f'yatube_page_cache_{outcome}_total{{view="test_page"}} '
+                f'{count}',
+                text
+            )
@@ -0,0 +1,133 @@
+import base64
+import json
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Post, User
+from ..utils.constants import QUANTITY_OF_POSTS
+from ..utils.paginator import CursorPaginator, encode_cursor, NEXT
+
+
+class CursorPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='post_author')
+        cls.posts = [
+            Post.objects.create(text='Post ' + str(i), author=cls.user)
+            for i in range(25)
+        ]
+        # Одинаковая дата у части постов: порядок держится на id.
+        Post.objects.filter(pk__in=[post.pk for post in cls.posts[5:15]])\
+            .update(pub_date=cls.posts[5].pub_date)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def walk(self, paginator):
+        pages = [paginator.get_page()]
+        while pages[-1].has_next():
+            pages.append(paginator.get_page(pages[-1].next_cursor))
+        return pages
+
+    def test_pages_cover_all_posts_once(self):
+        """Проход по курсорам выдаёт все посты ровно один раз"""
+        paginator = CursorPaginator(Post.objects.all(), QUANTITY_OF_POSTS)
+        pages = self.walk(paginator)
+        ids = [post.pk for page in pages for post in page]
+        expected = list(
+            Post.objects.order_by('-pub_date', '-id')
+            .values_list('pk', flat=True)
+        )
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual(ids, expected)
+        self.assertFalse(pages[0].has_previous())
+
+    def test_previous_cursor_returns_same_page(self):
+        """Курсор назад возвращает предыдущую страницу целиком"""
+        paginator = CursorPaginator(Post.objects.all(), QUANTITY_OF_POSTS)
+        first, second, third = self.walk(paginator)
+        back = paginator.get_page(third.previous_cursor)
+        self.assertEqual(list(back), list(second))
+        self.assertTrue(back.has_next())
+        first_again = paginator.get_page(second.previous_cursor)
+        self.assertEqual(list(first_again), list(first))
+        self.assertFalse(first_again.has_previous())
+
+    def test_empty_page_has_no_links(self):
+        """Пустая страница за последним постом не ссылается на соседние"""
+        oldest = min(self.posts, key=lambda post: (post.pub_date, post.pk))
+        cursor = encode_cursor(NEXT, [oldest.pub_date, oldest.pk])
+        paginator = CursorPaginator(Post.objects.all(), QUANTITY_OF_POSTS)
+        page = paginator.get_page(cursor)
+        self.assertEqual(list(page), [])
+        self.assertFalse(page.has_previous())
+        self.assertFalse(page.has_next())
+        self.assertIsNone(page.previous_cursor)
+        response = self.client.get(
+            reverse('posts:posts_index'), {'cursor': cursor}
+        )
+        self.assertNotContains(response, 'cursor=None')
+
+    def test_no_count_query(self):
+        """Страница строится одним запросом без COUNT"""
+        paginator = CursorPaginator(Post.objects.all(), QUANTITY_OF_POSTS)
+        with self.assertNumQueries(1):
+            paginator.get_page()
+
+    def test_broken_cursor_gives_first_page(self):
+        """Испорченный курсор не ломает страницу"""
+        url = reverse('posts:posts_index')
+        for cursor in ('garbage', 'WyJ4IiwgW11d', 'WyJuIiwgWzFdXQ'):
+            with self.subTest(cursor=cursor):
+                cache.clear()
+                response = self.client.get(url, {'cursor': cursor})
+                self.assertEqual(
+                    list(response.context['page_obj']),
+                    self.client.get(url).context['page_obj'].object_list
+                )
+
+    def test_junk_cursors_give_first_page(self):
+        """Курсоры с чужими типами и None не роняют ленты"""
+        cursors = [
+            base64.urlsafe_b64encode(json.dumps(raw).encode()).decode()
+            for raw in (
+                ['n', [1, 2]],
+                ['n', [None, None]],
+                ['p', ['2020-01-01T00:00:00', None]],
+                ['n', [[1], {}]],
+                ['n', ['2020-01-01T00:00:00', 'x']],
+                ['n', ['2020-01-01T00:00:00', 10 ** 30]],
+            )
+        ]
+        self.user.follower.create(author=self.user)
+        self.client.force_login(self.user)
+        urls = (
+            reverse('posts:posts_index'),
+            reverse('posts:profile', args=[self.user.username]),
+            reverse('posts:follow_index'),
+            reverse('posts:post_comments', args=[self.posts[0].pk]),
+        )
+        for url in urls:
+            for cursor in cursors:
+                with self.subTest(url=url, cursor=cursor):
+                    cache.clear()
+                    response = self.client.get(url, {'cursor': cursor})
+                    self.assertEqual(response.status_code, 200)
+        with self.settings(TIMELINE_FANOUT_LIMIT=1):
+            call_command('rebalance_timeline', stdout=StringIO())
+            for cursor in cursors:
+                with self.subTest(hybrid=True, cursor=cursor):
+                    response = self.client.get(urls[2], {'cursor': cursor})
+                    self.assertEqual(response.status_code, 200)
+
+    def test_next_link_rendered(self):
+        """В шаблоне есть ссылка на следующую страницу по курсору"""
+        response = self.client.get(reverse('posts:posts_index'))
+        page_obj = response.context['page_obj']
+        self.assertContains(response, '?cursor=' + page_obj.next_cursor)
@@ -0,0 +1,134 @@
+import re
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, override_settings, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+from ..utils.constants import QUANTITY_OF_POSTS
+
+# Полный проход по таблице без индекса и сортировка во временном
+# B-дереве: то, что ломается на больших таблицах. Поиск сортирует
+# найденные строки по релевантности, без этого ранжирования нет.
+# SQLite до 3.36 пишет SCAN TABLE; проход по индексу (SCAN ...
+# USING INDEX) - это чтение ленты по порядку, он допустим.
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?(?!CONSTANT ROW)\S+$')
+TEMP_SORT = re.compile(r'USE TEMP B-TREE')
+RANKED = re.compile(r'VIRTUAL TABLE')
+
+
+class QueryPlanTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='post_author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.posts = [
+            Post.objects.create(
+                text=f'пост {i}', author=cls.author,
+                group=cls.group if i % 2 else None,
+            ) for i in range(QUANTITY_OF_POSTS * 2 + 3)
+        ]
+        cls.post = cls.posts[0]
+        for i in range(30):
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text=str(i)
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def plans(self, url, data=None):
+        """План каждого SELECT, который выполнил запрос к url."""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+        plans = {}
+        with connection.cursor() as cursor:
+            for query in context.captured_queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT'):
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                plans[sql] = [row[-1] for row in cursor.fetchall()]
+        return response, plans
+
+    def assertIndexedPlans(self, url, data=None):
+        response, plans = self.plans(url, data)
+        for sql, steps in plans.items():
+            if any(RANKED.search(step) for step in steps):
+                continue
+            for step in steps:
+                with self.subTest(url=url, step=step):
+                    self.assertIsNone(FULL_SCAN.search(step), sql)
+                    self.assertIsNone(TEMP_SORT.search(step), sql)
+        return response
+
+    def walk(self, url, data=None):
+        """Первая страница и следующая по курсору."""
+        response = self.assertIndexedPlans(url, data)
+        page_obj = response.context['page_obj']
+        if page_obj.has_next():
+            self.assertIndexedPlans(
+                url, {**(data or {}), 'cursor': page_obj.next_cursor}
+            )
+
+    def test_index(self):
+        """Главная лента читается по индексу"""
+        self.walk(reverse('posts:posts_index'))
+
+    def test_group_list(self):
+        """Лента группы читается по индексу"""
+        self.walk(reverse('posts:group_list', args=[self.group.slug]))
+
+    def test_profile(self):
+        """Посты автора читаются по индексу"""
+        self.walk(reverse('posts:profile', args=[self.author.username]))
+
+    def test_post_detail(self):
+        """Страница поста не сканирует таблицы"""
+        self.assertIndexedPlans(
+            reverse('posts:post_detail', args=[self.post.pk])
+        )
+
+    def test_post_comments(self):
+        """Комментарии поста читаются по индексу"""
+        response = self.assertIndexedPlans(
+            reverse('posts:post_comments', args=[self.post.pk])
+        )
+        self.assertIndexedPlans(
+            reverse('posts:post_comments', args=[self.post.pk]),
+            {'cursor': response.context['comments'].next_cursor}
+        )
+
+    def test_follow_index(self):
+        """Лента подписок читается по индексу"""
+        self.walk(reverse('posts:follow_index'))
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_follow_index_hybrid(self):
+        """Подмешиваемые посты авторов читаются по индексу"""
+        call_command('rebalance_timeline', stdout=StringIO())
+        self.walk(reverse('posts:follow_index'))
+
+    def test_page_number(self):
+        """Старые ссылки ?page=N читаются по индексу"""
+        for url in (
+            reverse('posts:posts_index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.author.username]),
+        ):
+            response = self.assertIndexedPlans(url, {'page': 2})
+            self.assertEqual(response.context['page_obj'].number, 2)
+
+    def test_search(self):
+        """Поиск не сканирует таблицы постов"""
+        self.walk(reverse('posts:search'), {'q': 'пост'})
@@ -0,0 +1,118 @@
+import json
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Post, User
+from ..utils.search import install_triggers
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='post_author')
+        cls.best = Post.objects.create(
+            text='кот кот кот и пёс', author=cls.user
+        )
+        cls.other = Post.objects.create(
+            text='Про кота? Нет, про кот и длинный рассказ о погоде, '
+                 'дожде, ветре и облаках',
+            author=cls.user,
+        )
+        Post.objects.create(text='только пёс', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def search(self, query, **params):
+        response = self.client.get(
+            reverse('posts:search'), {'q': query, **params}
+        )
+        return response, list(response.context['page_obj'])
+
+    def test_ranked_results(self):
+        """Поиск находит посты со всеми словами, лучшие - первыми"""
+        _, found = self.search('кот')
+        self.assertEqual(found, [self.best, self.other])
+        _, found = self.search('кот пёс')
+        self.assertEqual(found, [self.best])
+
+    def test_index_follows_edits(self):
+        """Индекс обновляется при правке и удалении поста"""
+        self.best.text = 'теперь про мышь'
+        self.best.save()
+        self.assertEqual(self.search('мышь')[1], [self.best])
+        self.assertEqual(self.search('кот')[1], [self.other])
+        Post.objects.filter(pk=self.other.pk).delete()
+        self.assertEqual(self.search('кот')[1], [])
+
+    def test_cursor_pagination_keeps_query(self):
+        """Курсорные страницы поиска сохраняют запрос"""
+        Post.objects.bulk_create([
+            Post(text=f'слон номер {i}', author=self.user) for i in range(13)
+        ])
+        response, first = self.search('слон')
+        page_obj = response.context['page_obj']
+        self.assertContains(response, 'q=%D1%81%D0%BB%D0%BE%D0%BD&cursor=')
+        _, second = self.search('слон', cursor=page_obj.next_cursor)
+        self.assertEqual(len(first) + len(second), 13)
+        self.assertFalse(set(first) & set(second))
+
+    def test_query_syntax_is_not_interpreted(self):
+        """Синтаксис FTS5 и пустой запрос не ломают страницу"""
+        for query in ('', '"', 'кот OR', 'NEAR(', '*', 'кот AND -'):
+            with self.subTest(query=query):
+                response, _ = self.search(query)
+                self.assertEqual(response.status_code, 200)
+
+    def test_admin_uses_index(self):
+        """Поиск в админке идёт через индекс"""
+        admin = get_user_model().objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'кот'}
+        )
+        self.assertEqual(
+            set(response.context['cl'].result_list), {self.best, self.other}
+        )
+
+    def test_triggers_reinstalled(self):
+        """Повторная установка триггеров ничего не ломает"""
+        install_triggers()
+        post = Post.objects.create(text='жираф', author=self.user)
+        self.assertEqual(self.search('жираф')[1], [post])
+
+    def test_benchmark_search(self):
+        """Бенчмарк сравнивает FTS5 с LIKE и убирает созданные посты"""
+        out = StringIO()
+        before = Post.objects.count()
+        call_command(
+            'benchmark_search', posts=50, fill=True, repeat=1, queries=2,
+            stdout=out
+        )
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['posts'], 50)
+        self.assertIn('median_ms', report['fts'])
+        self.assertIn('median_ms', report['like'])
+        self.assertEqual(Post.objects.count(), before)
+        self.assertFalse(
+            User.objects.filter(username='search_benchmark').exists()
+        )
+        self.assertEqual(self.search(report['queries'][0])[1], [])
+
+    def test_benchmark_search_without_fill(self):
+        """Без --fill бенчмарк ничего не создаёт"""
+        out = StringIO()
+        call_command(
+            'benchmark_search', posts=50, repeat=1, queries=2, stdout=out
+        )
+        self.assertEqual(json.loads(out.getvalue())['posts'], 3)
+        self.assertEqual(Post.objects.count(), 3)
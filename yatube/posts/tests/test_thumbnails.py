@@ -0,0 +1,196 @@
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings, TestCase
+from django.urls import reverse
+
+from ..forms import PostForm
+from ..models import Post, User
+from ..utils import thumbnails
+from ..utils.constants import (
+    CARD_SIZES,
+    CARD_VARIANTS,
+    CARD_WIDTHS,
+    THUMBNAIL_GEOMETRIES
+)
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailPipelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='post_author')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+
+    def upload(self):
+        return SimpleUploadedFile(
+            name='small.gif', content=SMALL_GIF, content_type='image/gif'
+        )
+
+    def test_form_save_pregenerates_thumbnails(self):
+        """Сохранение формы с картинкой рисует все миниатюры"""
+        form = PostForm(
+            data={'text': 'Текст'}, files={'image': self.upload()}
+        )
+        form.instance.author = self.user
+        self.assertTrue(form.is_valid())
+        with mock.patch.object(
+            thumbnails, 'generate_thumbnails',
+            wraps=thumbnails.generate_thumbnails
+        ) as generate, mock.patch.object(
+            thumbnails.transaction, 'on_commit', side_effect=lambda f: f()
+        ):
+            post = form.save()
+        generate.assert_called_once_with(post.image)
+        futures = thumbnails.generate_thumbnails(post.image)
+        self.assertEqual(len(futures), len(THUMBNAIL_GEOMETRIES))
+        self.assertTrue(all(future.result().exists() for future in futures))
+
+    def test_concurrent_requests_share_one_render(self):
+        """Повторный запрос той же миниатюры ждёт уже начатую"""
+        post = Post.objects.create(
+            text='Текст', author=self.user, image=self.upload()
+        )
+        pending = thumbnails.Future()
+        with mock.patch.object(
+            thumbnails, '_submit', return_value=pending
+        ) as submit:
+            first = thumbnails.generate_thumbnails(post.image)
+            second = thumbnails.generate_thumbnails(post.image)
+        self.assertEqual(submit.call_count, len(THUMBNAIL_GEOMETRIES))
+        self.assertEqual(first, second)
+        pending.set_result(None)
+        self.assertEqual(thumbnails._in_flight, {})
+
+    def test_locked_thumbnail_waits_for_other_process(self):
+        """Миниатюру, которую рисует другой процесс, ждём, а не бросаем"""
+        post = Post.objects.create(
+            text='Текст', author=self.user, image=self.upload()
+        )
+        geometry, options = THUMBNAIL_GEOMETRIES[0]
+        lock_key = thumbnails._lock_key(post.image.name, geometry, options)
+        cache.add(lock_key, 1)
+
+        def finish_other(_):
+            # Другой процесс дорисовал миниатюру и отпустил блокировку.
+            render.assert_not_called()
+            cache.delete(lock_key)
+
+        with mock.patch.object(
+            thumbnails, 'get_thumbnail', return_value=mock.sentinel.image
+        ) as render, mock.patch.object(
+            thumbnails.time, 'sleep', side_effect=finish_other
+        ) as sleep:
+            result = thumbnails.render_thumbnail(post.image, geometry, options)
+        sleep.assert_called_once()
+        render.assert_called_once()
+        self.assertEqual(result, mock.sentinel.image)
+        self.assertIsNone(cache.get(lock_key))
+
+    def test_page_waits_for_pregeneration(self):
+        """Промах при выводе страницы ждёт уже начатую предрисовку"""
+        post = Post.objects.create(
+            text='Текст', author=self.user, image=self.upload()
+        )
+        pending = {}
+
+        def submit(function, image, geometry, options):
+            pending[geometry] = thumbnails.Future()
+            return pending[geometry]
+
+        with mock.patch.object(thumbnails, '_submit', side_effect=submit):
+            thumbnails.generate_thumbnails(post.image)
+        timer = threading.Timer(0.1, lambda: [
+            future.set_result(geometry)
+            for geometry, future in pending.items()
+        ])
+        timer.start()
+        with mock.patch.object(
+            thumbnails, '_submit'
+        ) as submit_again, mock.patch.object(
+            thumbnails, 'get_thumbnail'
+        ) as render:
+            result = thumbnails.resolve_thumbnails([post], CARD_VARIANTS)
+        timer.join()
+        submit_again.assert_not_called()
+        render.assert_not_called()
+        self.assertEqual(result, {
+            (post.pk, geometry): geometry for geometry, _ in CARD_VARIANTS
+        })
+
+    def test_page_thumbnails_resolved_in_one_batch(self):
+        """Все ширины миниатюр страницы находятся одним обращением"""
+        posts = [
+            Post.objects.create(
+                text=str(i), author=self.user, image=self.upload()
+            ) for i in range(3)
+        ]
+        expected = {
+            post.pk: [
+                thumbnails.get_thumbnail(post.image, geometry, **options).name
+                for geometry, options in CARD_VARIANTS
+            ] for post in posts
+        }
+        page = thumbnails.PageThumbnails(posts)
+        store_cache = thumbnails.default.kvstore.cache
+        with mock.patch.object(
+            store_cache, 'get_many', wraps=store_cache.get_many
+        ) as get_many, mock.patch.object(
+            store_cache, 'get', wraps=store_cache.get
+        ) as get, self.assertNumQueries(0):
+            found = {
+                post.pk: [image.name for image in page.get(post)]
+                for post in posts
+            }
+        get_many.assert_called_once()
+        get.assert_not_called()
+        self.assertEqual(found, expected)
+
+    def test_missing_thumbnails_read_from_table(self):
+        """Промахи кэша дочитываются из таблицы sorl одним запросом"""
+        posts = [
+            Post.objects.create(
+                text=str(i), author=self.user, image=self.upload()
+            ) for i in range(2)
+        ]
+        for post in posts:
+            thumbnails.generate_thumbnails(post.image)
+        cache.clear()
+        with self.assertNumQueries(1):
+            result = thumbnails.resolve_thumbnails(posts, CARD_VARIANTS)
+        self.assertEqual(len(result), len(posts) * len(CARD_VARIANTS))
+        self.assertTrue(all(image.exists() for image in result.values()))
+
+    def test_card_has_srcset(self):
+        """Карточка отдаёт все ширины в srcset и грузится лениво"""
+        for i in range(2):
+            Post.objects.create(
+                text=str(i), author=self.user, image=self.upload()
+            )
+        response = self.client.get(reverse('posts:posts_index'))
+        for width in CARD_WIDTHS:
+            self.assertContains(response, ' {}w'.format(width), count=2)
+        self.assertContains(response, f'sizes="{CARD_SIZES}"', count=2)
+        self.assertContains(response, 'loading="lazy"', count=1)
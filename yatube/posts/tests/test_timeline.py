@@ -0,0 +1,174 @@
+import json
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, override_settings, TestCase
+from django.urls import reverse
+
+from ..models import AuthorStats, Follow, Post, TimelineEntry, User
+from ..utils import timeline
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='post_author')
+        cls.follower = User.objects.create_user(username='follower')
+        Follow.objects.create(user=cls.follower, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.follower_client = Client()
+        self.follower_client.force_login(self.follower)
+
+    def test_new_post_fanned_out(self):
+        """Новый пост сразу попадает в ленту подписчика"""
+        self.author_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Новый пост'},
+        )
+        post = Post.objects.get(text='Новый пост')
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user=self.follower, post=post, pub_date=post.pub_date
+            ).exists()
+        )
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertIn(post, response.context['page_obj'])
+
+    def test_backfill_rebuilds_timeline(self):
+        """Команда backfill_timeline восстанавливает потерянную ленту"""
+        posts = [
+            Post.objects.create(text=str(i), author=self.author)
+            for i in range(3)
+        ]
+        TimelineEntry.objects.all().delete()
+        call_command('backfill_timeline', user='follower', stdout=StringIO())
+        self.assertEqual(
+            set(
+                self.follower.timeline.values_list('post_id', flat=True)
+            ),
+            {post.pk for post in posts}
+        )
+        TimelineEntry.objects.all().delete()
+        call_command('backfill_timeline', batch_size=2, stdout=StringIO())
+        self.assertEqual(self.follower.timeline.count(), len(posts))
+
+    def test_follow_feed_single_query(self):
+        """Лента подписок читается одним запросом"""
+        for i in range(5):
+            Post.objects.create(text=str(i), author=self.author)
+        # Сессия, пользователь, подмешиваемые авторы и сама лента.
+        with self.assertNumQueries(4):
+            self.follower_client.get(reverse('posts:follow_index'))
+
+
+@override_settings(TIMELINE_FANOUT_LIMIT=2)
+class HybridTimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.star = User.objects.create_user(username='star')
+        cls.author = User.objects.create_user(username='post_author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.other = User.objects.create_user(username='other')
+        Follow.objects.create(user=cls.reader, author=cls.star)
+        Follow.objects.create(user=cls.other, author=cls.star)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_star_posts_merged_on_read(self):
+        """Посты популярного автора подмешиваются в ленту при чтении"""
+        posts = [
+            Post.objects.create(
+                text=str(i), author=(self.star, self.author)[i % 2]
+            ) for i in range(13)
+        ]
+        self.assertFalse(
+            TimelineEntry.objects.filter(author=self.star).exists()
+        )
+        url = reverse('posts:follow_index')
+        first = self.reader_client.get(url).context['page_obj']
+        second = self.reader_client.get(
+            url, {'cursor': first.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(
+            list(first) + list(second),
+            sorted(posts, key=lambda post: (post.pub_date, post.id))[::-1]
+        )
+        back = self.reader_client.get(
+            url, {'cursor': second.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(back), list(first))
+
+    def author_posts(self, url):
+        cache.clear()
+        page = self.reader_client.get(url).context['page_obj']
+        return [post for post in page if post.author == self.author]
+
+    def author_entries(self):
+        return set(TimelineEntry.objects.filter(
+            author=self.author
+        ).values_list('post_id', flat=True))
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=3, TIMELINE_FANOUT_RESUME=2)
+    def test_author_crossing_limit(self):
+        """При смене режима ленты не теряют и не дублируют посты"""
+        newcomer = User.objects.create_user(username='newcomer')
+        url = reverse('posts:follow_index')
+        early = Post.objects.create(text='до порога', author=self.author)
+        Follow.objects.create(user=self.other, author=self.author)
+        Follow.objects.create(user=newcomer, author=self.author)
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.author).timeline_mode,
+            AuthorStats.PULL
+        )
+        pulled = Post.objects.create(text='после порога', author=self.author)
+        self.assertEqual(self.author_entries(), {early.pk})
+        self.assertEqual(self.author_posts(url), [pulled, early])
+        call_command('rebalance_timeline', stdout=StringIO())
+        self.assertEqual(self.author_entries(), set())
+        self.assertEqual(self.author_posts(url), [pulled, early])
+
+        # Между порогами режим не меняется.
+        Follow.objects.filter(user=newcomer, author=self.author).delete()
+        self.assertEqual(self.author_entries(), set())
+        # Под нижним порогом новые посты снова раскладываются, старые
+        # подмешиваются, пока команда не разложит их пачками.
+        Follow.objects.filter(user=self.other, author=self.author).delete()
+        later = Post.objects.create(text='под порогом', author=self.author)
+        self.assertEqual(self.author_entries(), {later.pk})
+        self.assertEqual(self.author_posts(url), [later, pulled, early])
+        call_command('rebalance_timeline', batch_size=1, stdout=StringIO())
+        self.assertEqual(
+            self.author_entries(), {early.pk, pulled.pk, later.pk}
+        )
+        self.assertEqual(
+            timeline.pulled_authors(self.reader.pk), [self.star.pk]
+        )
+        self.assertEqual(self.author_posts(url), [later, pulled, early])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=3, TIMELINE_FANOUT_RESUME=2)
+    def test_limit_jumped_over(self):
+        """Порог, перепрыгнутый одновременными подписками, не теряется"""
+        AuthorStats.objects.filter(user=self.author).update(
+            followers_count=5
+        )
+        Follow.objects.create(user=self.other, author=self.author)
+        self.assertTrue(timeline.is_pulled(self.author.pk))
+
+    def test_benchmark_feed(self):
+        """Бенчмарк ленты сравнивает все способы чтения"""
+        Post.objects.create(text='текст', author=self.star)
+        out = StringIO()
+        call_command('benchmark_feed', 'reader', repeat=2, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(set(report), {'authors', 'join', 'push', 'pull'})
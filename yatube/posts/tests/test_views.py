@@ -9,7 +9,8 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase
 from django.urls import reverse
 
-from ..models import Group, Post, User
+from ..models import Comment, Group, Post, User
+from ..utils.constants import COMMENTS_PER_PAGE
 
 
 class StaticPagesURLTests(TestCase):
@@ -297,19 +298,81 @@ class CacheIndexTest(TestCase):
         first_content = self.authorized_client.get(
             reverse('posts:posts_index')
         ).content
-        Post.objects.create(
+        post = Post.objects.create(
             text='Текст',
             author=self.user,
         )
         second_content = self.authorized_client.get(
             reverse('posts:posts_index')
         ).content
-        self.assertEqual(first_content, second_content)
-        cache.clear()
+        self.assertNotEqual(first_content, second_content)
+        # Запись мимо моделей сигналов не шлёт - страница из кэша.
+        Post.objects.filter(pk=post.pk).update(text='Другой текст')
         third_content = self.authorized_client.get(
             reverse('posts:posts_index')
         ).content
-        self.assertNotEqual(second_content, third_content)
+        self.assertEqual(second_content, third_content)
+        cache.clear()
+        fourth_content = self.authorized_client.get(
+            reverse('posts:posts_index')
+        ).content
+        self.assertNotEqual(third_content, fourth_content)
+
+    def test_group_and_profile_pages_invalidated(self):
+        """Страницы группы и профиля сбрасываются при записи поста"""
+        group = Group.objects.create(
+            title='Группа', slug='test-slug', description='Описание'
+        )
+        pages = (
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'post_author'}),
+        )
+        for page in pages:
+            self.authorized_client.get(page)
+        post = Post.objects.create(text='Текст', author=self.user)
+        post.group = group
+        post.save()
+        for page in pages:
+            with self.subTest(page=page):
+                self.assertIn(
+                    post, self.authorized_client.get(page).context['page_obj']
+                )
+
+    def test_visitors_get_own_copies(self):
+        """Закэшированная страница одного посетителя не достаётся другому"""
+        other = User.objects.create_user(username='other_reader')
+        other_client = Client()
+        other_client.force_login(other)
+        for url in (
+            reverse('posts:posts_index'),
+            reverse('posts:profile', kwargs={'username': 'post_author'}),
+        ):
+            with self.subTest(url=url):
+                self.authorized_client.get(url)
+                self.assertEqual(
+                    self.authorized_client.get(url)['X-Cache'], 'hit'
+                )
+                response = other_client.get(url)
+                self.assertEqual(response['X-Cache'], 'miss')
+                self.assertContains(response, 'Пользователь: other_reader')
+                self.assertNotContains(response, 'Пользователь: post_author')
+                response = Client().get(url)
+                self.assertEqual(response['X-Cache'], 'miss')
+                self.assertNotContains(response, 'Пользователь:')
+
+    def test_renamed_profile_invalidated(self):
+        """После переименования старый адрес профиля не отдаётся"""
+        user = User.objects.create(username='old_name')
+        old_page = reverse('posts:profile', kwargs={'username': 'old_name'})
+        self.assertEqual(
+            self.authorized_client.get(old_page).status_code, HTTPStatus.OK
+        )
+        user.username = 'new_name'
+        user.save()
+        self.assertEqual(
+            self.authorized_client.get(old_page).status_code,
+            HTTPStatus.NOT_FOUND
+        )
 
 
 class FollowTest(TestCase):
@@ -384,3 +447,171 @@ class FollowTest(TestCase):
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertEqual((len(follow)), 0)
         self.assertNotIn(object, follow)
+
+
+class CommentsPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='post_author')
+        cls.post = Post.objects.create(text='текст', author=cls.user)
+        cls.commentators = [
+            User.objects.create_user(username=f'reader_{i}')
+            for i in range(5)
+        ]
+        Comment.objects.bulk_create(
+            Comment(
+                post=cls.post,
+                author=cls.commentators[i % 5],
+                text=f'Комментарий {i}',
+            ) for i in range(COMMENTS_PER_PAGE + 5)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_comments_paginated(self):
+        """На странице поста первая порция комментариев и ссылка на ещё"""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_PER_PAGE)
+        self.assertContains(response, 'data-more-comments')
+
+        fragment = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}),
+            {'cursor': comments.next_cursor},
+        )
+        self.assertTemplateUsed(fragment, 'posts/includes/comments.html')
+        self.assertEqual(len(fragment.context['comments']), 5)
+        self.assertNotContains(fragment, 'data-more-comments')
+        shown = list(comments) + list(fragment.context['comments'])
+        self.assertEqual(
+            shown, list(self.post.comments.order_by('-created', '-id'))
+        )
+
+    def test_comment_authors_loaded_in_bulk(self):
+        """Авторы комментариев не запрашиваются по одному"""
+        with self.assertNumQueries(2):
+            self.client.get(
+                reverse(
+                    'posts:post_comments', kwargs={'post_id': self.post.pk}
+                )
+            )
+
+    def test_fragment_for_missing_post(self):
+        """Фрагмент комментариев несуществующего поста отдаёт 404"""
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': 10 ** 6})
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+class PostDetailCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='post_author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            text='Старый текст', author=self.user, group=self.group
+        )
+        self.url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk}
+        )
+        self.author_client = Client()
+        self.author_client.force_login(self.user)
+
+    def test_fixed_number_of_queries(self):
+        """Страница поста собирается двумя запросами"""
+        for i in range(3):
+            Comment.objects.create(post=self.post, author=self.user, text='.')
+        with self.assertNumQueries(2):
+            self.client.get(self.url)
+
+    def test_rendered_post_cached_until_write(self):
+        """Тело поста берётся из кэша, пока пост не изменят"""
+        self.client.get(self.url)
+        Post.objects.filter(pk=self.post.pk).update(text='Тихая правка')
+        self.assertContains(self.client.get(self.url), 'Старый текст')
+
+        self.author_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.pk}),
+            data={'text': 'Новый текст'},
+        )
+        self.assertContains(self.client.get(self.url), 'Новый текст')
+
+    def test_comment_invalidates_sidebar(self):
+        """Новый комментарий обновляет счётчик в боковой колонке"""
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Комментариев:  <span>0')
+        self.author_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            data={'text': 'Комментарий'},
+        )
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Комментариев:  <span>1')
+
+    def test_author_and_group_invalidate_sidebar(self):
+        """Правка автора и группы обновляет боковую колонку"""
+        self.client.get(self.url)
+        author = User.objects.get(pk=self.user.pk)
+        author.first_name = 'Новое'
+        author.last_name = 'Имя'
+        author.save()
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новая группа'
+        group.save()
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Автор: Новое Имя')
+        self.assertContains(response, 'Группа: Новая группа')
+
+
+class CardCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='post_author', first_name='Старое'
+        )
+        self.post = Post.objects.create(
+            text='Старый текст', author=self.user, group=self.group
+        )
+        self.url = reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+
+    def test_card_cached_between_feeds(self):
+        """Отрисованная карточка переиспользуется в других лентах"""
+        self.client.get(self.url)
+        Post.objects.filter(pk=self.post.pk).update(text='Тихая правка')
+        self.assertContains(self.client.get(self.url), 'Старый текст')
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'post_author'})
+        )
+        self.assertNotContains(response, 'все посты пользователя')
+        self.assertContains(response, 'Тихая правка')
+
+    def test_card_invalidated_by_post_and_author(self):
+        """Карточка перерисовывается после правки поста или автора"""
+        self.client.get(self.url)
+        self.post.text = 'Новый текст'
+        self.post.save()
+        self.assertContains(self.client.get(self.url), 'Новый текст')
+        self.user.first_name = 'Новое'
+        self.user.save()
+        self.assertContains(self.client.get(self.url), 'Новое')
@@ -1,6 +1,47 @@
-from django.views.decorators.cache import cache_page
+from operator import itemgetter
+
+from .page_cache import swr_cache_page
 
 
 FIRST_CHARACTERS_OF_POST = 15
 QUANTITY_OF_POSTS = 10
-CACHE_PAGE = cache_page(20, key_prefix='index_page')
+# Ключ постраничной выдачи: последнее поле делает его уникальным.
+POST_ORDERING = ('-pub_date', '-id')
+COMMENT_ORDERING = ('-created', '-id')
+COMMENTS_PER_PAGE = 20
+TIMELINE_ORDERING = ('-pub_date', '-post_id')
+TIMELINE_BATCH_SIZE = 1000
+# Картинка карточки в нескольких ширинах для srcset; последняя -
+# основная, её получают браузеры без srcset.
+CARD_WIDTHS = (320, 640, 960)
+CARD_RATIO = 339 / 960
+CARD_OPTIONS = {'crop': 'center', 'upscale': True}
+CARD_VARIANTS = tuple(
+    ('{}x{}'.format(width, round(width * CARD_RATIO)), CARD_OPTIONS)
+    for width in CARD_WIDTHS
+)
+CARD_THUMBNAIL = CARD_VARIANTS[-1]
+CARD_SIZES = '(max-width: 960px) 100vw, 960px'
+# Размеры миниатюр, которые рисуются сразу после загрузки картинки.
+THUMBNAIL_GEOMETRIES = CARD_VARIANTS
+THUMBNAIL_LOCK_TIMEOUT = 60
+# Как часто проверять блокировку миниатюры, которую рисует другой процесс.
+THUMBNAIL_LOCK_POLL = 0.05
+# Отрисованные фрагменты живут долго: их ключи содержат версию.
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
+# Страницы лент сбрасываются сигналами, свежесть по времени - страховка.
+# После PAGE_CACHE_SOFT_TTL копия ещё отдаётся, пока один запрос
+# строит новую, а после PAGE_CACHE_HARD_TTL удаляется.
+PAGE_CACHE_SOFT_TTL = 60 * 60
+PAGE_CACHE_HARD_TTL = 60 * 60 * 24
+CACHE_PAGE = swr_cache_page(
+    PAGE_CACHE_SOFT_TTL, PAGE_CACHE_HARD_TTL, 'index_page'
+)
+CACHE_GROUP_PAGE = swr_cache_page(
+    PAGE_CACHE_SOFT_TTL, PAGE_CACHE_HARD_TTL, 'group_page',
+    itemgetter('slug')
+)
+CACHE_PROFILE_PAGE = swr_cache_page(
+    PAGE_CACHE_SOFT_TTL, PAGE_CACHE_HARD_TTL, 'profile_page',
+    itemgetter('username')
+)
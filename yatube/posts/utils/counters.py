@@ -0,0 +1,80 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются атомарным UPDATE ... SET x = x + 1 из сигналов
+моделей, а расхождения исправляет команда recount.
+"""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from ..models import AuthorStats, Comment, Follow, Post, User
+
+
+STATS_FIELDS = ('posts_count', 'followers_count', 'following_count')
+
+
+def _count(model, field):
+    totals = model.objects.filter(
+        **{field: OuterRef('pk')}
+    ).order_by().values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(totals), 0)
+
+
+def bump_author(user_id, field, delta):
+    stats = AuthorStats.objects.filter(user_id=user_id)
+    if delta < 0:
+        # Строку уже могло снести каскадное удаление пользователя:
+        # воссоздавать её ради вычитания нельзя, счётчик уйдёт в минус.
+        stats.filter(**{f'{field}__gte': -delta}).update(
+            **{field: F(field) + delta}
+        )
+        return
+    if not stats.update(**{field: F(field) + delta}):
+        # Строки ещё нет: считаем всё с нуля, запись уже в базе.
+        recount_users([user_id])
+
+
+def bump_comments(post_id, delta):
+    posts = Post.objects.filter(pk=post_id)
+    if delta < 0:
+        posts = posts.filter(comments_count__gte=-delta)
+    posts.update(comments_count=F('comments_count') + delta)
+
+
+def recount_users(user_ids):
+    """Пересчитывает счётчики пользователей, возвращает число исправлений."""
+    fresh = User.objects.filter(pk__in=user_ids).annotate(
+        posts_total=_count(Post, 'author'),
+        followers_total=_count(Follow, 'author'),
+        following_total=_count(Follow, 'user'),
+    ).values_list(
+        'pk', 'posts_total', 'followers_total', 'following_total'
+    )
+    current = AuthorStats.objects.in_bulk(user_ids)
+    created, changed = [], []
+    for pk, *totals in fresh:
+        stats = current.get(pk)
+        if stats is None:
+            created.append(AuthorStats(user_id=pk, **dict(
+                zip(STATS_FIELDS, totals)
+            )))
+        elif [getattr(stats, field) for field in STATS_FIELDS] != totals:
+            for field, total in zip(STATS_FIELDS, totals):
+                setattr(stats, field, total)
+            changed.append(stats)
+    AuthorStats.objects.bulk_create(created, ignore_conflicts=True)
+    AuthorStats.objects.bulk_update(changed, STATS_FIELDS)
+    return len(created) + len(changed)
+
+
+def recount_posts(post_ids):
+    """Пересчитывает число комментариев постов."""
+    changed = []
+    fresh = Post.objects.filter(pk__in=post_ids).annotate(
+        total=_count(Comment, 'post')
+    ).only('pk', 'comments_count')
+    for post in fresh:
+        if post.comments_count != post.total:
+            post.comments_count = post.total
+            changed.append(post)
+    Post.objects.bulk_update(changed, ['comments_count'])
+    return len(changed)
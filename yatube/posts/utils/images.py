@@ -0,0 +1,124 @@
+"""Подготовка картинок постов при загрузке.
+
+Картинка поворачивается по ориентации из EXIF, уменьшается до
+IMAGE_MAX_SIDE по большей стороне, теряет EXIF, XMP и комментарии
+и перекодируется в IMAGE_FORMAT с качеством IMAGE_QUALITY. Если
+картинка и так не больше предела, без метаданных, а перекодирование
+не делает файл меньше, остаётся исходный файл.
+
+Для каждой картинки сохраняется заглушка - JPEG размером
+PLACEHOLDER_SIZE с тем же кадрированием, что у карточки, в виде
+data URI: его можно вставить прямо в страницу.
+"""
+import base64
+import io
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+
+PLACEHOLDER_SIZE = (32, 11)
+PLACEHOLDER_QUALITY = 40
+EXTENSIONS = {'JPEG': '.jpg', 'WEBP': '.webp', 'PNG': '.png'}
+METADATA = ('exif', 'xmp', 'XML:com.adobe.xmp', 'comment', 'photoshop')
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+
+
+def _target_format(image, image_format):
+    image_format = image_format.upper()
+    if image_format == 'WEBP' and not features.check('webp'):
+        image_format = 'JPEG'
+    if image_format == 'JPEG' and _has_alpha(image):
+        # JPEG не хранит прозрачность.
+        image_format = 'PNG'
+    return image_format
+
+
+def _encode(image, image_format, quality, icc_profile):
+    options = {'icc_profile': icc_profile} if icc_profile else {}
+    if image_format == 'JPEG':
+        image = image.convert('L' if image.mode in ('L', '1') else 'RGB')
+        options.update(quality=quality, optimize=True, progressive=True)
+    elif image_format == 'WEBP':
+        image = image.convert('RGBA' if _has_alpha(image) else 'RGB')
+        options.update(quality=quality, method=6)
+    else:
+        if image.mode not in ('RGB', 'RGBA', 'L', 'LA', 'P'):
+            image = image.convert('RGBA')
+        options.update(optimize=True)
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def normalize_bytes(data, max_side, image_format, quality):
+    """Возвращает (байты, расширение) или None, если менять нечего.
+
+    Не обращается к Django, поэтому годится для пула процессов.
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        if getattr(source, 'is_animated', False):
+            # Анимацию перекодирование превратило бы в один кадр.
+            return None
+        oversized = max(source.size) > max_side
+        has_metadata = any(source.info.get(key) for key in METADATA)
+        icc_profile = source.info.get('icc_profile')
+        image_format = _target_format(source, image_format)
+        image = ImageOps.exif_transpose(source)
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        result = _encode(image, image_format, quality, icc_profile)
+    if not oversized and not has_metadata and len(result) >= len(data):
+        return None
+    return result, EXTENSIONS[image_format]
+
+
+def normalize_upload(upload):
+    """Нормализованная копия загруженного файла или он сам."""
+    upload.seek(0)
+    normalized = normalize_bytes(
+        upload.read(),
+        settings.IMAGE_MAX_SIDE,
+        settings.IMAGE_FORMAT,
+        settings.IMAGE_QUALITY,
+    )
+    upload.seek(0)
+    if normalized is None:
+        return upload
+    data, extension = normalized
+    name = os.path.splitext(os.path.basename(upload.name))[0] + extension
+    return ContentFile(data, name=name)
+
+
+def placeholder_bytes(data):
+    """data URI крошечной копии картинки; пустая строка для битой.
+
+    Не обращается к Django, поэтому годится для пула процессов.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as source:
+            image = ImageOps.exif_transpose(source).convert('RGB')
+    except (OSError, ValueError):
+        return ''
+    image = ImageOps.fit(image, PLACEHOLDER_SIZE, Image.BILINEAR)
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=PLACEHOLDER_QUALITY, optimize=True)
+    return 'data:image/jpeg;base64,' + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+def image_placeholder(image):
+    """Заглушка для файла картинки; пустая строка, если файла нет."""
+    if not image:
+        return ''
+    image.seek(0)
+    data = image.read()
+    image.seek(0)
+    return placeholder_bytes(data)
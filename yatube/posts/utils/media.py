@@ -0,0 +1,147 @@
+"""Счётчики ссылок постов на файлы картинок и поиск брошенных файлов.
+
+Ссылка добавляется и снимается атомарным UPDATE из сигналов Post,
+файл и его миниатюры удаляются после фиксации транзакции, в которой
+счётчик дошёл до нуля. Уже лежащий файл, который ImageStorage.save
+отдаёт новой загрузке, до конца её транзакции держит ссылка pin.
+
+Файлы, оставшиеся от времени до счётчиков или от сбоев, находит
+orphaned_files: отсортированный обход каталога сливается
+с отсортированным по пачкам столбцом Post.image, так что в памяти
+одна пачка имён и один каталог. Сравнение строк в Python совпадает
+с BINARY-сортировкой SQLite; для баз с другой collation слияние
+нужно проверять.
+"""
+import os
+
+from django.db import transaction
+from django.db.models import F
+from sorl.thumbnail import default, delete
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore
+
+from ..models import MediaFile, Post
+from .uploads import UPLOAD_DIR, image_storage
+
+
+def retain(name):
+    if not name:
+        return
+    if not MediaFile.objects.filter(name=name).update(
+        references=F('references') + 1
+    ):
+        _, created = MediaFile.objects.get_or_create(
+            name=name, defaults={'references': 1}
+        )
+        if not created:
+            # Строку успел создать параллельный запрос.
+            retain(name)
+
+
+def release(name):
+    if not name:
+        return
+    MediaFile.objects.filter(name=name).update(
+        references=F('references') - 1
+    )
+    transaction.on_commit(lambda: collect(name))
+
+
+def pin(name):
+    """Ссылка на файл, пока пост с ним не сохранится.
+
+    Снимается после фиксации транзакции, к этому времени пост
+    уже взял свою.
+    """
+    retain(name)
+    transaction.on_commit(lambda: MediaFile.objects.filter(
+        name=name
+    ).update(references=F('references') - 1))
+
+
+def collect(name):
+    """Удаляет файл с миниатюрами, если на него больше не ссылаются."""
+    # Строка и файл уходят в одной транзакции: pin ждёт её конца
+    # и после этого видит, остался ли файл.
+    with transaction.atomic():
+        deleted, _ = MediaFile.objects.filter(
+            name=name, references__lte=0
+        ).delete()
+        if deleted:
+            delete(ImageFile(name, image_storage))
+
+
+def iter_files(storage, directory=UPLOAD_DIR):
+    """Имена файлов под directory в порядке сортировки строк."""
+    if not storage.exists(directory):
+        return
+    directories, files = storage.listdir(directory)
+    # Файлы каталога x идут после всех имён, меньших 'x/'.
+    entries = sorted(
+        [(name + '/', True) for name in directories]
+        + [(name, False) for name in files]
+    )
+    for name, is_directory in entries:
+        path = os.path.join(directory, name.rstrip('/'))
+        if is_directory:
+            yield from iter_files(storage, path)
+        else:
+            yield path
+
+
+def iter_referenced(batch_size):
+    """Значения Post.image по возрастанию, пачками без OFFSET."""
+    last = ''
+    while True:
+        batch = list(
+            Post.objects.filter(image__gt=last).order_by('image')
+            .values_list('image', flat=True).distinct()[:batch_size]
+        )
+        yield from batch
+        if len(batch) < batch_size:
+            return
+        last = batch[-1]
+
+
+def orphaned_files(storage, batch_size):
+    """Файлы картинок, на которые не ссылается ни один пост."""
+    referenced = iter_referenced(batch_size)
+    current = next(referenced, None)
+    for name in iter_files(storage):
+        while current is not None and current < name:
+            current = next(referenced, None)
+        if current != name:
+            yield name
+
+
+def orphaned_thumbnail_sources(storage, batch_size):
+    """Записи sorl о картинках постов, файлов которых уже нет.
+
+    По ним находятся миниатюры, оставшиеся от удалённых картинок.
+    """
+    prefix = last = add_prefix('', 'image')
+    while True:
+        batch = list(
+            KVStore.objects.filter(
+                key__startswith=prefix, key__gt=last
+            ).order_by('key').values_list('key', 'value')[:batch_size]
+        )
+        for key, value in batch:
+            image = deserialize_image_file(value)
+            if image.name.startswith(UPLOAD_DIR + '/') \
+                    and not storage.exists(image.name):
+                yield image
+        if len(batch) < batch_size:
+            return
+        last = batch[-1][0]
+
+
+def remove_orphan(name):
+    """Удаляет брошенный файл вместе с миниатюрами и счётчиком."""
+    MediaFile.objects.filter(name=name).delete()
+    delete(ImageFile(name, image_storage))
+
+
+def remove_thumbnails(image):
+    default.kvstore.delete(image)
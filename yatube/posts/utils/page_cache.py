@@ -0,0 +1,137 @@
+"""Кэш страниц лент: версии, stale-while-revalidate и single-flight.
+
+Запись кэша хранит ответ, версию страницы и момент, до которого
+ответ свежий (soft TTL). Сам ключ живёт hard TTL. Устаревшую копию -
+по времени или потому что версию страницы сменил сигнал - перестраивает
+ровно один запрос, взявший блокировку, а остальные в это время
+получают старую копию. Страница зависит от посетителя, поэтому
+копии, блокировки и старые копии у каждой сессии свои (Vary: Cookie).
+
+Исход каждого запроса (hit, stale, refresh, miss) считается
+в cache_registry с меткой вида страницы и виден на /-/metrics/.
+"""
+import hashlib
+import logging
+from functools import wraps
+from time import time
+
+from django.core.cache import cache
+from django.utils.cache import (
+    get_cache_key,
+    has_vary_header,
+    learn_cache_key,
+    patch_cache_control,
+    patch_vary_headers
+)
+
+from core.metrics import Registry, registries
+
+from .versions import bump_version, get_version
+
+
+logger = logging.getLogger(__name__)
+
+LOCK_TIMEOUT = 30
+
+OUTCOMES = ('hit', 'stale', 'refresh', 'miss')
+CACHE_METRICS = (
+    ('yatube_page_cache_hit_total', 'Отдана свежая копия', None),
+    ('yatube_page_cache_stale_total', 'Отдана устаревшая копия, '
+     'пока страницу перестраивает другой запрос', None),
+    ('yatube_page_cache_refresh_total', 'Устаревшая копия перестроена',
+     None),
+    ('yatube_page_cache_miss_total', 'Страница построена без копии',
+     None),
+)
+
+cache_registry = Registry(CACHE_METRICS, shared=True)
+registries.append(cache_registry)
+
+
+def _page_id(page):
+    # slug и имя пользователя могут быть не ASCII, ключи кэша - нет.
+    return hashlib.md5(str(page).encode()).hexdigest()
+
+
+def invalidate_page(kind, page=None):
+    bump_version(kind, '' if page is None else _page_id(page))
+
+
+def _cacheable(request, response):
+    if response.streaming or response.status_code != 200:
+        return False
+    if 'private' in response.get('Cache-Control', ()):
+        return False
+    # Как UpdateCacheMiddleware: не кэшируем ответ, выдающий
+    # анонимному посетителю новую cookie.
+    return not (
+        not request.COOKIES and response.cookies
+        and has_vary_header(response, 'Cookie')
+    )
+
+
+def _record(kind, outcome, response):
+    cache_registry.observe(
+        kind, [int(outcome == name) for name in OUTCOMES]
+    )
+    logger.debug('page cache %s: %s', kind, outcome)
+    response['X-Cache'] = outcome
+    # Страница зависит от посетителя и сбрасывается сигналами: хранит
+    # её только сервер, браузеры и прокси каждый раз спрашивают заново.
+    patch_cache_control(response, private=True, max_age=0)
+    return response
+
+
+def swr_cache_page(soft_ttl, hard_ttl, kind, key=None):
+    """Кэширует GET-ответы вьюхи с отдачей устаревшей копии.
+
+    key(kwargs) выделяет страницу внутри kind, например slug группы;
+    без key страница одна. Запись, меняющая страницу, вызывает
+    invalidate_page.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            page = _page_id(key(kwargs)) if key else ''
+            version = get_version(kind, page)
+            prefix = '{}.{}'.format(kind, page)
+            cache_key = get_cache_key(request, prefix, 'GET', cache=cache)
+            entry = cache.get(cache_key) if cache_key else None
+            if entry is not None:
+                if entry['version'] == version and entry['fresh'] > time():
+                    return _record(kind, 'hit', entry['response'])
+                outcome = 'stale'
+            else:
+                outcome = 'miss'
+            lock_key = 'lock.{}'.format(cache_key or prefix)
+            if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+                # Страницу уже перестраивает другой запрос.
+                if entry is not None:
+                    return _record(kind, 'stale', entry['response'])
+                return _record(
+                    kind, 'miss', view(request, *args, **kwargs)
+                )
+            try:
+                response = view(request, *args, **kwargs)
+                # Vary: Cookie SessionMiddleware добавит только после
+                # вьюхи, а ключ строится сейчас: без него копию
+                # одного посетителя получали бы все остальные.
+                patch_vary_headers(response, ('Cookie',))
+                if _cacheable(request, response):
+                    cache_key = learn_cache_key(
+                        request, response, hard_ttl, prefix, cache=cache
+                    )
+                    cache.set(cache_key, {
+                        'response': response,
+                        'version': version,
+                        'fresh': time() + soft_ttl,
+                    }, hard_ttl)
+            finally:
+                cache.delete(lock_key)
+            return _record(
+                kind, 'refresh' if outcome == 'stale' else 'miss', response
+            )
+        return wrapper
+    return decorator
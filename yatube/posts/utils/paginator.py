@@ -0,0 +1,240 @@
+import base64
+import heapq
+import json
+from collections.abc import Sequence
+from datetime import datetime
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from .constants import POST_ORDERING
+
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class InvalidCursor(Exception):
+    """Курсор не удалось разобрать."""
+
+
+def _dump_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def encode_cursor(direction, values):
+    """Упаковывает направление и значения ключа в непрозрачную строку."""
+    raw = json.dumps([direction, [_dump_value(value) for value in values]])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    padded = token + '=' * (-len(token) % 4)
+    try:
+        direction, values = json.loads(
+            base64.urlsafe_b64decode(padded.encode())
+        )
+    except (ValueError, TypeError) as error:
+        raise InvalidCursor(token) from error
+    if direction not in (NEXT, PREVIOUS) or not isinstance(values, list):
+        raise InvalidCursor(token)
+    return direction, values
+
+
+def _flip(name):
+    return name[1:] if name.startswith('-') else '-' + name
+
+
+class CursorPage(Sequence):
+    """Страница курсорной выдачи.
+
+    Повторяет ту часть интерфейса django.core.paginator.Page,
+    которой пользуются шаблоны, и дополнительно отдаёт курсоры
+    соседних страниц.
+    """
+
+    def __init__(self, object_list, paginator, has_next, has_previous,
+                 get_key=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        get_key = get_key or paginator.get_key
+        # Курсоры считаются сразу: после этого object_list
+        # можно подменить, например, на связанные посты.
+        self.next_cursor = None
+        self.previous_cursor = None
+        if object_list and has_next:
+            self.next_cursor = encode_cursor(NEXT, get_key(object_list[-1]))
+        if object_list and has_previous:
+            self.previous_cursor = encode_cursor(
+                PREVIOUS, get_key(object_list[0])
+            )
+        # У пустой страницы курсоров нет, и ссылок на соседние тоже:
+        # иначе шаблон построил бы адрес ?cursor=None.
+        self._has_next = self.next_cursor is not None
+        self._has_previous = self.previous_cursor is not None
+
+    def __repr__(self):
+        return '<Cursor page of %s objects>' % len(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+
+class CursorPaginator:
+    """Постраничный вывод по ключу (keyset pagination).
+
+    Страница выбирается условием по полям сортировки вместо OFFSET,
+    поэтому глубокие страницы стоят столько же, сколько первая,
+    а COUNT выполняется только при обращении к count.
+    Последнее поле сортировки должно быть уникальным.
+    """
+
+    is_cursor = True
+
+    def __init__(self, object_list, per_page, ordering=POST_ORDERING):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.fields = [name.lstrip('-') for name in self.ordering]
+
+    @cached_property
+    def count(self):
+        return self.object_list.count()
+
+    def get_key(self, obj):
+        return [getattr(obj, field) for field in self.fields]
+
+    def get_page(self, cursor=None):
+        """Возвращает страницу по курсору; битый курсор даёт первую."""
+        direction, values = NEXT, None
+        if cursor:
+            try:
+                direction, values = decode_cursor(cursor)
+                values = self._to_python(values)
+            except InvalidCursor:
+                direction, values = NEXT, None
+        forward = direction == NEXT
+        rows = list(self._fetch(values, forward))
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if forward:
+            return CursorPage(rows, self, has_more, values is not None)
+        rows.reverse()
+        return CursorPage(rows, self, True, has_more)
+
+    def _fetch(self, values, forward):
+        queryset = self.object_list.order_by(*(
+            self.ordering if forward
+            else [_flip(name) for name in self.ordering]
+        ))
+        if values is not None:
+            queryset = queryset.filter(self._after(values, forward))
+        return queryset[:self.per_page + 1]
+
+    def _after(self, values, forward):
+        """Условие «строго после ключа» в направлении обхода."""
+        condition = Q()
+        for index, name in enumerate(self.ordering):
+            lookup = 'lt' if name.startswith('-') == forward else 'gt'
+            term = Q(**dict(zip(self.fields[:index], values[:index])))
+            term &= Q(**{f'{self.fields[index]}__{lookup}': values[index]})
+            condition |= term
+        return condition
+
+    def _to_python(self, values):
+        if len(values) != len(self.fields):
+            raise InvalidCursor(values)
+        opts = self.object_list.model._meta
+        try:
+            values = [
+                opts.get_field(field).to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+        except (
+            FieldDoesNotExist, ValidationError, TypeError, ValueError
+        ) as error:
+            raise InvalidCursor(values) from error
+        # Курсор можно собрать руками: None в условие не подставить,
+        # а слишком большое число не влезет в INTEGER базы.
+        for value in values:
+            if value is None or isinstance(value, int) and not (
+                -2 ** 63 <= value < 2 ** 63
+            ):
+                raise InvalidCursor(values)
+        return values
+
+
+class MergedCursorPaginator:
+    """Слияние нескольких курсорных источников с общим ключом.
+
+    sources - пары (CursorPaginator, transform). Ключи всех источников
+    должны совпадать по смыслу и направлению сортировки, например
+    (pub_date, post_id) ленты и (pub_date, id) постов автора.
+    Из каждого источника берётся не больше per_page + 1 строк,
+    и они сливаются в одну страницу через heapq.merge; get_key
+    возвращает ключ уже преобразованного объекта.
+    """
+
+    is_cursor = True
+
+    def __init__(self, sources, per_page, get_key):
+        self.sources = list(sources)
+        self.per_page = int(per_page)
+        self.get_key = get_key
+
+    def get_page(self, cursor=None):
+        direction, values = NEXT, None
+        if cursor:
+            try:
+                direction, values = decode_cursor(cursor)
+            except InvalidCursor:
+                direction, values = NEXT, None
+        forward = direction == NEXT
+        streams = []
+        for paginator, transform in self.sources:
+            try:
+                start = None if values is None else paginator._to_python(
+                    values
+                )
+            except InvalidCursor:
+                return self.get_page()
+            streams.append([
+                (tuple(paginator.get_key(row)), transform(row))
+                for row in paginator._fetch(start, forward)
+            ])
+        descending = self.sources[0][0].ordering[0].startswith('-')
+        merged = heapq.merge(
+            *streams, key=lambda item: item[0], reverse=descending == forward
+        )
+        rows, seen = [], set()
+        for key, obj in merged:
+            # Один пост может прийти и из ленты, и напрямую от автора.
+            if key in seen:
+                continue
+            seen.add(key)
+            rows.append(obj)
+            if len(rows) > self.per_page:
+                break
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if forward:
+            return CursorPage(
+                rows, self, has_more, values is not None, self.get_key
+            )
+        rows.reverse()
+        return CursorPage(rows, self, True, has_more, self.get_key)
@@ -0,0 +1,132 @@
+"""Полнотекстовый поиск по тексту постов на FTS5 SQLite.
+
+posts_post_fts - индекс с внешним содержимым над posts_post. Его
+обновляют триггеры базы, поэтому он видит и bulk_create, и update().
+SQLite при изменении схемы пересоздаёт таблицу posts_post и теряет
+её триггеры, так что после каждого migrate они ставятся заново.
+На других базах поиск идёт через LIKE.
+"""
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+
+from .paginator import NEXT, CursorPage, InvalidCursor, decode_cursor
+
+
+FTS_TABLE = 'posts_post_fts'
+TRIGGERS = (
+    f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert '
+    f'AFTER INSERT ON posts_post BEGIN '
+    f'INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); END',
+    f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete '
+    f'AFTER DELETE ON posts_post BEGIN '
+    f'INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) '
+    f"VALUES ('delete', old.id, old.text); END",
+    f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update '
+    f'AFTER UPDATE OF text ON posts_post BEGIN '
+    f'INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) '
+    f"VALUES ('delete', old.id, old.text); "
+    f'INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); END',
+)
+
+
+def fts_available(using=connection):
+    return using.vendor == 'sqlite'
+
+
+def install_triggers(using=DEFAULT_DB_ALIAS, **kwargs):
+    """Ставит триггеры индекса; подключается к post_migrate."""
+    connection = connections[using]
+    if not fts_available(connection):
+        return
+    tables = connection.introspection.table_names()
+    if FTS_TABLE not in tables or 'posts_post' not in tables:
+        return
+    with connection.cursor() as cursor:
+        for sql in TRIGGERS:
+            cursor.execute(sql)
+
+
+def match_expression(query):
+    """Запрос пользователя как безопасное выражение MATCH.
+
+    Каждое слово берётся в кавычки, так что синтаксис FTS5 в запросе
+    не работает; все слова должны встретиться в посте.
+    """
+    return ' '.join('"{}"'.format(word) for word in re.findall(r'\w+', query))
+
+
+def filter_matching(queryset, query):
+    """Оставляет в queryset постов только подходящие под запрос.
+
+    RawSQL в pk__in Django 2.2 берёт в лишние скобки, и подзапрос
+    становится скалярным, поэтому условие добавляется через extra.
+    """
+    return queryset.extra(
+        where=[
+            f'{queryset.model._meta.db_table}.id IN (SELECT rowid FROM '
+            f'{FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)'
+        ],
+        params=[match_expression(query)],
+    )
+
+
+class SearchPaginator:
+    """Курсорная выдача результатов поиска по убыванию релевантности.
+
+    Ключ страницы - (rank, id): rank из bm25 меньше у более
+    подходящих постов.
+    """
+
+    is_cursor = True
+
+    def __init__(self, queryset, query, per_page):
+        self.queryset = queryset
+        self.match = match_expression(query)
+        self.per_page = int(per_page)
+
+    @staticmethod
+    def get_key(post):
+        return [post.search_rank, post.pk]
+
+    def get_page(self, cursor=None):
+        direction, values = NEXT, None
+        if cursor:
+            try:
+                direction, values = decode_cursor(cursor)
+                rank, pk = values
+                values = [float(rank), int(pk)]
+            except (InvalidCursor, TypeError, ValueError):
+                direction, values = NEXT, None
+        forward = direction == NEXT
+        if not self.match:
+            return CursorPage([], self, False, False)
+        rows = self._fetch(values, forward)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+        posts = self.queryset.in_bulk([pk for pk, _ in rows])
+        object_list = []
+        for pk, rank in rows:
+            post = posts.get(pk)
+            if post is not None:
+                post.search_rank = rank
+                object_list.append(post)
+        if forward:
+            return CursorPage(object_list, self, has_more, values is not None)
+        return CursorPage(object_list, self, True, has_more)
+
+    def _fetch(self, values, forward):
+        sql = f'SELECT rowid, rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+        params = [self.match]
+        if values is not None:
+            sign = '>' if forward else '<'
+            sql += f' AND (rank {sign} %s OR rank = %s AND rowid {sign} %s)'
+            params += [values[0], values[0], values[1]]
+        order = '' if forward else ' DESC'
+        sql += f' ORDER BY rank{order}, rowid{order} LIMIT %s'
+        params.append(self.per_page + 1)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
@@ -0,0 +1,246 @@
+"""Миниатюры картинок постов, подготовленные заранее.
+
+После сохранения поста с новой картинкой все размеры из
+THUMBNAIL_GEOMETRIES рисуются в пуле потоков, и первый посетитель
+ленты получает готовую миниатюру из хранилища sorl-thumbnail.
+Одновременные запросы одной миниатюры склеиваются: внутри процесса -
+общим Future, между процессами - блокировкой в общем кэше, которую
+второй процесс ждёт. Через тот же путь идут и промахи при выводе
+страницы, так что картинку рисует только один запрос.
+
+PageThumbnails находит все ширины миниатюр всех постов страницы ленты
+одним get_many к кэшу sorl (и одним запросом к его таблице для
+промахов) вместо отдельного обращения из каждого тега {% thumbnail %}.
+"""
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore as CachedDBStore
+from sorl.thumbnail.models import KVStore
+
+from .constants import (
+    CARD_VARIANTS,
+    THUMBNAIL_GEOMETRIES,
+    THUMBNAIL_LOCK_POLL,
+    THUMBNAIL_LOCK_TIMEOUT
+)
+
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_lock = threading.RLock()
+_in_flight = {}
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+        return _executor
+
+
+def _lock_key(name, geometry, options):
+    raw = '{}:{}:{}'.format(name, geometry, sorted(options.items()))
+    return 'thumbnail-lock:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def _acquire(lock_key):
+    """Берёт блокировку, дождавшись, пока её отпустит другой процесс."""
+    deadline = time.monotonic() + THUMBNAIL_LOCK_TIMEOUT
+    while not cache.add(lock_key, 1, THUMBNAIL_LOCK_TIMEOUT):
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(THUMBNAIL_LOCK_POLL)
+    return True
+
+
+def render_thumbnail(image, geometry, options):
+    """Рисует миниатюру или ждёт, пока её нарисует другой процесс.
+
+    После ожидания get_thumbnail найдёт готовую миниатюру в kvstore
+    и рисовать не станет.
+    """
+    lock_key = _lock_key(image.name, geometry, options)
+    locked = _acquire(lock_key)
+    try:
+        return get_thumbnail(image, geometry, **options)
+    except Exception:
+        logger.exception('Не удалось нарисовать миниатюру %s', image.name)
+        raise
+    finally:
+        if locked:
+            cache.delete(lock_key)
+        if threading.current_thread() is not threading.main_thread():
+            connections.close_all()
+
+
+def _forget(key):
+    with _lock:
+        _in_flight.pop(key, None)
+
+
+def generate_thumbnails(image, geometries=THUMBNAIL_GEOMETRIES):
+    """Ставит в очередь размеры картинки, возвращает их Future."""
+    futures = []
+    for geometry, options in geometries:
+        key = (image.name, geometry, tuple(sorted(options.items())))
+        with _lock:
+            future = _in_flight.get(key)
+            if future is None:
+                future = _submit(render_thumbnail, image, geometry, options)
+                _in_flight[key] = future
+                future.add_done_callback(lambda _, key=key: _forget(key))
+        futures.append(future)
+    return futures
+
+
+def _submit(function, *args):
+    if settings.THUMBNAIL_WORKERS:
+        return _get_executor().submit(function, *args)
+    # Без пула миниатюра рисуется сразу, в текущем потоке.
+    future = Future()
+    try:
+        future.set_result(function(*args))
+    except Exception as error:
+        future.set_exception(error)
+    return future
+
+
+def pregenerate_thumbnails(post):
+    """Рисует миниатюры картинки поста после фиксации транзакции."""
+    if post.image:
+        image = post.image
+        transaction.on_commit(lambda: generate_thumbnails(image))
+
+
+class _NamingBackend(ThumbnailBackend):
+    def thumbnail_file(self, file_, geometry, **options):
+        """Файл миниатюры без обращения к хранилищу и kvstore.
+
+        Повторяет подготовку опций из ThumbnailBackend.get_thumbnail,
+        чтобы имя совпало с тем, что нарисует sorl.
+        """
+        source = ImageFile(file_)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry, options)
+        return ImageFile(name, default.storage)
+
+
+def _render_for_page(image, geometry, options):
+    return generate_thumbnails(image, [(geometry, dict(options))])[0]
+
+
+def _wait(future):
+    try:
+        return future.result()
+    except Exception:
+        # Ошибку уже записал render_thumbnail. Как и тег {% thumbnail %}:
+        # без миниатюры карточка всё равно нужна.
+        return None
+
+
+def resolve_thumbnails(posts, variants):
+    """Словарь (id поста, геометрия) -> миниатюра картинки поста.
+
+    variants - пары (геометрия, опции); все они ищутся вместе.
+    """
+    wanted = [
+        (post, geometry, options)
+        for post in posts if post.image
+        for geometry, options in variants
+    ]
+    if not isinstance(default.kvstore, CachedDBStore):
+        futures = {
+            (post.pk, geometry): _render_for_page(
+                post.image, geometry, options
+            ) for post, geometry, options in wanted
+        }
+        return {key: _wait(future) for key, future in futures.items()}
+    backend = _NamingBackend()
+    # Посты с одинаковой картинкой делят файл и его миниатюры.
+    keys = {}
+    for post, geometry, options in wanted:
+        key = add_prefix(
+            backend.thumbnail_file(post.image, geometry, **options).key
+        )
+        keys.setdefault(key, []).append((post, geometry, options))
+    store_cache = default.kvstore.cache
+    found = store_cache.get_many(list(keys))
+    missing = [key for key, value in found.items() if value == EMPTY_VALUE]
+    missing += [key for key in keys if key not in found]
+    if missing:
+        for key, value in KVStore.objects.filter(
+            key__in=missing
+        ).values_list('key', 'value'):
+            found[key] = value
+            store_cache.set(
+                key, value, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT
+            )
+    # Миниатюры ещё нет: все промахи страницы рисуются сразу, а если
+    # их уже рисует предрисовка или другой запрос - ждём его.
+    pending = {}
+    for key, targets in keys.items():
+        value = found.get(key)
+        if not value or value == EMPTY_VALUE:
+            post, geometry, options = targets[0]
+            pending[key] = _render_for_page(post.image, geometry, options)
+    result = {}
+    for key, targets in keys.items():
+        if key in pending:
+            image = _wait(pending[key])
+        else:
+            image = deserialize_image_file(found[key])
+        for post, geometry, _ in targets:
+            result[post.pk, geometry] = image
+    return result
+
+
+class PageThumbnails:
+    """Миниатюры карточек страницы, найденные при первом обращении.
+
+    Если все карточки взяты из кэша фрагментов, поиска не будет вовсе.
+    """
+
+    def __init__(self, posts, variants=CARD_VARIANTS):
+        self.posts = posts
+        self.variants = variants
+        self._resolved = None
+
+    def get(self, post):
+        """Миниатюры поста в порядке variants, без ненарисованных."""
+        if self._resolved is None:
+            self._resolved = resolve_thumbnails(self.posts, self.variants)
+        if not post.image:
+            return []
+        if (post.pk, self.variants[-1][0]) not in self._resolved:
+            self._resolved.update(resolve_thumbnails([post], self.variants))
+        images = (
+            self._resolved.get((post.pk, geometry))
+            for geometry, _ in self.variants
+        )
+        return [image for image in images if image is not None]
@@ -0,0 +1,216 @@
+"""Материализованная лента подписок (fan-out on write).
+
+Каждый новый пост сразу раскладывается по лентам подписчиков автора,
+а follow_index читает ленту одним проходом по индексу
+(user, pub_date, post) без соединения с Follow.
+
+Авторы в режиме AuthorStats.PULL по лентам не раскладываются: их посты
+подмешиваются при чтении слиянием курсоров по (pub_date, id) - гибридный
+режим. Автор переходит в него, когда подписчиков становится не меньше
+settings.TIMELINE_FANOUT_LIMIT, а обратно - только когда их меньше
+settings.TIMELINE_FANOUT_RESUME: промежуток между порогами не даёт
+автору у границы менять режим на каждой подписке. Запрос только
+переключает флаг; убирает записи из лент и раскладывает старые посты
+пачками команда rebalance_timeline. Пока она не прошла, автор в режиме
+PUSHING: новые посты уже раскладываются, а старые ещё подмешиваются,
+и слияние убирает повторы.
+"""
+from itertools import islice
+from operator import attrgetter
+
+from django.conf import settings
+from django.db import transaction
+
+from ..models import AuthorStats, Follow, Post, TimelineEntry
+from .constants import POST_ORDERING, TIMELINE_BATCH_SIZE, TIMELINE_ORDERING
+from .paginator import CursorPaginator, MergedCursorPaginator
+
+
+def _bulk_insert(entries, batch_size=TIMELINE_BATCH_SIZE):
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, batch_size))
+        if not batch:
+            break
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def _entries_for_posts(user_id, posts):
+    for post_id, author_id, pub_date in posts:
+        yield TimelineEntry(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        )
+
+
+# Режимы, в которых посты автора подмешиваются при чтении.
+READ_MODES = (AuthorStats.PULL, AuthorStats.PUSHING)
+
+
+def is_pulled(author_id):
+    """Новые посты автора не раскладываются по лентам подписчиков."""
+    return AuthorStats.objects.filter(
+        user_id=author_id, timeline_mode=AuthorStats.PULL
+    ).exists()
+
+
+def pulled_authors(user_id, modes=READ_MODES):
+    """Авторы из подписок читателя, чьи посты подмешиваются при чтении."""
+    return list(
+        Follow.objects.filter(
+            user_id=user_id, author__stats__timeline_mode__in=modes
+        ).values_list('author_id', flat=True)
+    )
+
+
+def fan_out_post(post):
+    """Добавляет новый пост в ленты всех подписчиков автора."""
+    if is_pulled(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    _bulk_insert(
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post.pk,
+            author_id=post.author_id,
+            pub_date=post.pub_date,
+        ) for user_id in followers.iterator()
+    )
+
+
+def add_author(user_id, author_id):
+    """Переносит посты автора в ленту нового подписчика."""
+    if is_pulled(author_id):
+        return
+    posts = Post.objects.filter(
+        author_id=author_id
+    ).values_list('id', 'author_id', 'pub_date')
+    _bulk_insert(_entries_for_posts(user_id, posts.iterator()))
+
+
+def switch_author_mode(author_id, delta):
+    """Меняет режим автора после изменения числа подписчиков на delta.
+
+    Сравнение по порогу, а не на равенство: две одновременные
+    подписки не проскочат переход.
+    """
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    if limit is None:
+        return
+    stats = AuthorStats.objects.filter(user_id=author_id)
+    if delta > 0:
+        stats.filter(followers_count__gte=limit).exclude(
+            timeline_mode=AuthorStats.PULL
+        ).update(timeline_mode=AuthorStats.PULL)
+    else:
+        stats.filter(
+            timeline_mode=AuthorStats.PULL,
+            followers_count__lt=settings.TIMELINE_FANOUT_RESUME,
+        ).update(timeline_mode=AuthorStats.PUSHING)
+
+
+def sync_author_modes():
+    """Приводит режимы всех авторов к порогам, например после recount."""
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    pulled = AuthorStats.objects.filter(timeline_mode=AuthorStats.PULL)
+    if limit is None:
+        return 0, pulled.update(timeline_mode=AuthorStats.PUSHING)
+    return (
+        AuthorStats.objects.filter(followers_count__gte=limit).exclude(
+            timeline_mode=AuthorStats.PULL
+        ).update(timeline_mode=AuthorStats.PULL),
+        pulled.filter(
+            followers_count__lt=settings.TIMELINE_FANOUT_RESUME
+        ).update(timeline_mode=AuthorStats.PUSHING),
+    )
+
+
+def drop_author(author_id, batch_size=TIMELINE_BATCH_SIZE):
+    """Убирает посты подмешиваемого автора из всех лент пачками."""
+    entries = TimelineEntry.objects.filter(author_id=author_id)
+    removed = 0
+    while True:
+        batch = list(entries.values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            return removed
+        removed += TimelineEntry.objects.filter(pk__in=batch).delete()[0]
+
+
+def fan_out_author(author_id, batch_size=TIMELINE_BATCH_SIZE):
+    """Раскладывает старые посты автора в режиме PUSHING по лентам.
+
+    Новые посты и новые подписчики уже обрабатываются сигналами,
+    поэтому после раскладки автор переходит в PUSH, если за это
+    время снова не набрал подписчиков.
+    """
+    posts = list(Post.objects.filter(
+        author_id=author_id
+    ).values_list('id', 'author_id', 'pub_date'))
+    followers = Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True)
+    _bulk_insert(
+        (
+            entry
+            for user_id in followers.iterator()
+            for entry in _entries_for_posts(user_id, posts)
+        ),
+        batch_size,
+    )
+    return AuthorStats.objects.filter(
+        user_id=author_id, timeline_mode=AuthorStats.PUSHING
+    ).update(timeline_mode=AuthorStats.PUSH)
+
+
+def remove_author(user_id, author_id):
+    """Убирает посты автора из ленты отписавшегося читателя."""
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def rebuild_timeline(user_id, batch_size=TIMELINE_BATCH_SIZE):
+    """Пересобирает ленту читателя по текущим подпискам."""
+    posts = Post.objects.filter(
+        author__following__user_id=user_id
+    ).exclude(
+        author_id__in=pulled_authors(user_id, [AuthorStats.PULL])
+    ).values_list('id', 'author_id', 'pub_date')
+    with transaction.atomic():
+        TimelineEntry.objects.filter(user_id=user_id).delete()
+        _bulk_insert(_entries_for_posts(user_id, posts.iterator()), batch_size)
+
+
+def timeline_queryset(user):
+    return TimelineEntry.objects.filter(user=user).select_related(
+        'post__author', 'post__group'
+    )
+
+
+def _as_is(obj):
+    return obj
+
+
+def hybrid_paginator(user, pulled, per_page, use_timeline=True):
+    """Сливает ленту читателя с постами подмешиваемых авторов."""
+    sources = []
+    if use_timeline:
+        sources.append((
+            CursorPaginator(
+                timeline_queryset(user), per_page, TIMELINE_ORDERING
+            ),
+            attrgetter('post'),
+        ))
+    for author_id in pulled:
+        posts = Post.objects.filter(
+            author_id=author_id
+        ).select_related('author', 'group')
+        sources.append((
+            CursorPaginator(posts, per_page, POST_ORDERING),
+            _as_is,
+        ))
+    return MergedCursorPaginator(
+        sources, per_page, attrgetter('pub_date', 'id')
+    )
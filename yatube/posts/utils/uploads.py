@@ -0,0 +1,106 @@
+"""Хранение картинок постов по содержимому.
+
+Имя файла - sha1 его содержимого, поэтому одинаковые загрузки
+ложатся в один файл и получают один набор миниатюр sorl. Сколько
+постов ссылается на файл, считает MediaFile; файл удаляется вместе
+с миниатюрами, когда уходит последняя ссылка.
+
+MEDIA_SHARDING выбирает каталог:
+'hash' - posts/ab/cd/ по первым байтам хэша,
+'date' - posts/ГГГГ/ММ/ДД/ по дате публикации поста,
+None - все файлы в одном каталоге posts/.
+Полностью одинаковые загрузки склеиваются только при 'hash', в
+остальных случаях - в пределах одного каталога.
+"""
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+
+UPLOAD_DIR = 'posts'
+HASH_LEVELS = 2
+
+
+def content_hash(file):
+    digest = hashlib.sha1()
+    file.seek(0)
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def shard_dir(strategy, digest=None, date=None):
+    """Подкаталог внутри UPLOAD_DIR для выбранного способа."""
+    if strategy == 'hash':
+        return os.path.join(*(
+            digest[level * 2:level * 2 + 2] for level in range(HASH_LEVELS)
+        ))
+    if strategy == 'date':
+        return date.strftime('%Y/%m/%d')
+    if strategy is None:
+        return ''
+    raise ValueError(f'Неизвестный способ раскладки: {strategy}')
+
+
+def addressed_name(directory, filename, digest):
+    return os.path.join(
+        directory, digest + os.path.splitext(filename)[1].lower()
+    )
+
+
+def sharded_name(strategy, filename, file, date=None):
+    """Имя, под которым ImageStorage сохранит file."""
+    digest = content_hash(file)
+    return addressed_name(
+        os.path.join(
+            UPLOAD_DIR, shard_dir(strategy, digest, date or timezone.now())
+        ),
+        filename,
+        digest,
+    )
+
+
+def post_image_path(instance, filename):
+    """upload_to для Post.image.
+
+    Здесь выбирается только каталог по дате: содержимое файла
+    доступно лишь ImageStorage.save, он и достраивает имя.
+    """
+    strategy = settings.MEDIA_SHARDING
+    if strategy == 'hash':
+        return os.path.join(UPLOAD_DIR, filename)
+    return os.path.join(
+        UPLOAD_DIR,
+        shard_dir(strategy, date=instance.pub_date or timezone.now()),
+        filename,
+    )
+
+
+@deconstructible
+class ImageStorage(FileSystemStorage):
+    """Файловое хранилище, где имя файла - хэш содержимого."""
+
+    def save(self, name, content, max_length=None):
+        directory, filename = os.path.split(name)
+        digest = content_hash(content)
+        if settings.MEDIA_SHARDING == 'hash' and directory == UPLOAD_DIR:
+            directory = os.path.join(directory, shard_dir('hash', digest))
+        name = addressed_name(directory, filename, digest)
+        if self.exists(name):
+            # Такой файл уже загружали: новая копия не нужна. Пока
+            # пост не взял ссылку, файл мог бы удалить collect,
+            # поэтому сначала ссылка, потом повторная проверка.
+            # media импортирует это хранилище, отсюда импорт здесь.
+            from .media import pin
+            pin(name)
+            if self.exists(name):
+                return name
+        return super().save(name, content, max_length)
+
+
+image_storage = ImageStorage()
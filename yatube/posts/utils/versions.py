@@ -0,0 +1,54 @@
+"""Версии объектов для ключей кэша отрисованных фрагментов.
+
+Фрагмент кэшируется под ключом с версией объекта, а запись
+в объект просто меняет версию: старые фрагменты больше никто
+не запрашивает, и они вытесняются сами. Версия - время в
+наносекундах, поэтому после вытеснения самой версии номер
+не повторится и старый фрагмент не оживёт.
+"""
+from time import time_ns
+
+from django.core.cache import cache
+
+
+VERSION_KEY = 'version:{}:{}'
+
+
+def get_versions(kind, ids):
+    """Возвращает словарь id -> версия, заводя недостающие версии."""
+    keys = {VERSION_KEY.format(kind, pk): pk for pk in ids}
+    found = cache.get_many(keys)
+    missing = {key: time_ns() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return {keys[key]: version for key, version in found.items()}
+
+
+def get_version(kind, pk):
+    return get_versions(kind, [pk])[pk]
+
+
+def bump_version(kind, pk):
+    cache.set(VERSION_KEY.format(kind, pk), time_ns(), None)
+
+
+def attach_card_versions(posts):
+    """Проставляет постам card_version - ключ фрагмента карточки.
+
+    Карточка зависит от поста, его автора и группы, поэтому ключ
+    складывается из трёх версий; они берутся тремя запросами
+    к кэшу на всю страницу.
+    """
+    posts = list(posts)
+    post_versions = get_versions('post', [post.pk for post in posts])
+    user_versions = get_versions('user', {post.author_id for post in posts})
+    group_versions = get_versions(
+        'group', {post.group_id for post in posts if post.group_id}
+    )
+    for post in posts:
+        post.card_version = '{}.{}.{}'.format(
+            post_versions[post.pk],
+            user_versions[post.author_id],
+            group_versions.get(post.group_id, 0),
+        )
@@ -1,18 +1,50 @@
+from operator import attrgetter
+from urllib.parse import urlencode
+
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, redirect, render
 
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
-from .utils.constants import CACHE_PAGE, QUANTITY_OF_POSTS
-
-
-def get_context(objects, request):
-    paginator = Paginator(objects, QUANTITY_OF_POSTS)
+from .models import Comment, Follow, Group, Post, User
+from .utils import timeline
+from .utils.constants import (
+    CACHE_GROUP_PAGE,
+    CACHE_PAGE,
+    CACHE_PROFILE_PAGE,
+    COMMENT_ORDERING,
+    COMMENTS_PER_PAGE,
+    FRAGMENT_CACHE_TIMEOUT,
+    POST_ORDERING,
+    QUANTITY_OF_POSTS,
+    TIMELINE_ORDERING
+)
+from .utils.paginator import CursorPaginator
+from .utils.search import SearchPaginator, fts_available
+from .utils.thumbnails import PageThumbnails
+from .utils.versions import attach_card_versions, get_version
+
+
+def get_context(objects, request, ordering=POST_ORDERING, transform=None):
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    if page_number is not None:
+        # Старые ссылки вида ?page=N продолжают работать через OFFSET.
+        paginator = Paginator(objects.order_by(*ordering), QUANTITY_OF_POSTS)
+        page_obj = paginator.get_page(page_number)
+    else:
+        paginator = CursorPaginator(objects, QUANTITY_OF_POSTS, ordering)
+        page_obj = paginator.get_page(request.GET.get('cursor'))
+    if transform is not None:
+        page_obj.object_list = [transform(obj) for obj in page_obj]
+    return page_context(page_obj)
+
+
+def page_context(page_obj):
+    attach_card_versions(page_obj)
     return {
         'page_obj': page_obj,
+        'cache_timeout': FRAGMENT_CACHE_TIMEOUT,
+        'thumbnails': PageThumbnails(page_obj),
     }
 
 
@@ -29,6 +61,7 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+@CACHE_GROUP_PAGE
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     context = {'group': group}
@@ -41,8 +74,12 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@CACHE_PROFILE_PAGE
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('stats'),
+        username=username
+    )
     following = False
     not_me = True
     if request.user.username == username:
@@ -54,22 +91,68 @@ def profile(request, username):
         'following': following,
         'not_me': not_me
     }
-    posts = author.posts.select_related('group').prefetch_related('comments')
+    posts = author.posts.select_related('group')
     context.update(get_context(posts, request))
     return render(request, 'posts/profile.html', context)
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    posts = Post.objects.select_related('author', 'group')
+    if fts_available():
+        paginator = SearchPaginator(posts, query, QUANTITY_OF_POSTS)
+    else:
+        paginator = CursorPaginator(
+            posts.filter(text__icontains=query) if query else posts.none(),
+            QUANTITY_OF_POSTS
+        )
+    context = {'query': query, 'page_query': urlencode({'q': query})}
+    context.update(
+        page_context(paginator.get_page(request.GET.get('cursor')))
+    )
+    return render(request, 'posts/search.html', context)
+
+
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    # Пост со всем, что нужно шаблону, и страница комментариев
+    # с авторами - два запроса; тело поста берётся из кэша по версии
+    # поста, боковая колонка - ещё и по версиям автора и группы.
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'),
+        pk=post_id
+    )
+    attach_card_versions([post])
     form = CommentForm()
     context = {
         'post': post,
         'author': str(post.author),
         'form': form,
+        'comments': get_comments_page(post.pk, request),
+        'post_version': get_version('post', post.pk),
+        'cache_timeout': FRAGMENT_CACHE_TIMEOUT,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def get_comments_page(post_id, request):
+    paginator = CursorPaginator(
+        Comment.objects.filter(post_id=post_id).select_related('author'),
+        COMMENTS_PER_PAGE,
+        COMMENT_ORDERING
+    )
+    return paginator.get_page(request.GET.get('cursor'))
+
+
+def post_comments(request, post_id):
+    """Следующая страница комментариев для подгрузки на post_detail."""
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    context = {
+        'post_id': post.pk,
+        'comments': get_comments_page(post.pk, request),
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
 @login_required
 def post_create(request):
     username = request.user.username
@@ -124,12 +207,21 @@ def add_comment(request, post_id):
 @login_required
 def follow_index(request):
     context = {'follow': True}
-    context.update(get_context(
-        Post.objects.filter(
-            author__following__user=request.user
-        ).select_related('author', 'group').prefetch_related('comments'),
-        request
-    ))
+    pulled = timeline.pulled_authors(request.user.pk)
+    if pulled:
+        paginator = timeline.hybrid_paginator(
+            request.user, pulled, QUANTITY_OF_POSTS
+        )
+        context.update(
+            page_context(paginator.get_page(request.GET.get('cursor')))
+        )
+    else:
+        context.update(get_context(
+            timeline.timeline_queryset(request.user),
+            request,
+            ordering=TIMELINE_ORDERING,
+            transform=attrgetter('post'),
+        ))
     return render(request, 'posts/follow.html', context)
 
 
@@ -57,6 +57,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Первым, чтобы время ответа включало все остальные middleware.
+    'core.metrics.MetricsMiddleware',
+    'core.profiling.ProfilerMiddleware',
+    'core.memory.MemoryMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -72,6 +76,15 @@ INTERNAL_IPS = [
     '127.0.0.1',
 ]
 
+# Токен, с которым Prometheus забирает /-/metrics/; пока он пуст,
+# метрики не отдаются. За nginx REMOTE_ADDR у всех 127.0.0.1,
+# поэтому доступ проверяется токеном, а не адресом.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+# Общий файл метрик всех воркеров и как часто воркер дописывает
+# в него накопленное, в секундах.
+METRICS_PATH = os.path.join(BASE_DIR, 'cache', 'metrics.sqlite3')
+METRICS_FLUSH_INTERVAL = 5
+
 ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
@@ -84,7 +97,8 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, замеряющий время отрисовки для метрик.
+        'BACKEND': 'core.metrics.TimedTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -155,10 +169,64 @@ STATIC_URL = '/static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Посты авторов, у которых подписчиков не меньше этого числа,
+# не раскладываются по лентам, а подмешиваются при чтении.
+# None - раскладывать всегда. Обратно в ленты автор возвращается,
+# когда подписчиков меньше TIMELINE_FANOUT_RESUME; старые посты
+# раскладывает команда rebalance_timeline, её запускает cron.
+TIMELINE_FANOUT_LIMIT = 100_000
+TIMELINE_FANOUT_RESUME = 90_000
+
+# Потоки, в которых заранее рисуются миниатюры новых картинок;
+# 0 - рисовать сразу в запросе.
+THUMBNAIL_WORKERS = 2
+
+# Загруженные картинки уменьшаются до IMAGE_MAX_SIDE пикселей
+# по большей стороне и перекодируются в IMAGE_FORMAT (JPEG или WEBP;
+# WEBP без поддержки в Pillow заменяется на JPEG).
+IMAGE_MAX_SIDE = 2048
+IMAGE_FORMAT = 'JPEG'
+IMAGE_QUALITY = 85
+
+# Раскладка картинок постов по подкаталогам: 'hash', 'date' или None.
+# Уже загруженные файлы переносит команда shard_media.
+MEDIA_SHARDING = 'hash'
+
+# Выборочное профилирование запросов: доля случайных запросов,
+# вьюхи, которые профилируются всегда, и шаг снятия стеков в секундах.
+# Профиль отдельного запроса включает заголовок X-Profile со значением
+# PROFILER_TOKEN; пока токен пуст, заголовки X-Profile
+# и X-Profile-Memory не действуют.
+PROFILER_SAMPLE_RATE = 0
+PROFILER_VIEWS = []
+PROFILER_INTERVAL = 0.005
+PROFILER_DIR = os.path.join(BASE_DIR, 'profiles')
+PROFILER_MAX_FILES = 50
+PROFILER_TOKEN = os.environ.get('PROFILER_TOKEN', '')
+
+# Учёт памяти через tracemalloc: доля запросов и вьюхи, которые
+# меряются всегда. Для отдельного запроса включается заголовком
+# X-Profile-Memory с PROFILER_TOKEN. Отслеживание замедляет запрос
+# в разы.
+MEMORY_SAMPLE_RATE = 0
+MEMORY_VIEWS = []
+
+# Быстрый уровень в памяти каждого воркера и общий для всех
+# воркеров файл SQLite: попадания не зависят от числа процессов,
+# а сброс кэша в одном воркере виден остальным.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.TwoTierCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100_000,
+            'LOCAL_MAX_ENTRIES': 2000,
+            'LOCAL_MAX_BYTES': 32 * 2 ** 20,
+            'SYNC_INTERVAL': 1,
+        },
     }
 }
 
+TEST_RUNNER = 'core.runner.TempFilesRunner'
+
 